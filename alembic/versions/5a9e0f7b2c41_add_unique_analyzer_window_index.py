@@ -0,0 +1,36 @@
+"""Add unique analyzer window index to entity_risk_history
+
+Revision ID: 5a9e0f7b2c41
+Revises: b4e7a91c3d20
+Create Date: 2025-12-05 11:22:48.930517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a9e0f7b2c41'
+down_revision: Union[str, None] = 'b4e7a91c3d20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+ANALYZER_ROWS = sa.text("deleted_at IS NULL AND generator = 'analyzer_service'")
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ux_entity_risk_history_analyzer_window',
+        'entity_risk_history',
+        ['entity_id', 'observed_at'],
+        unique=True,
+        postgresql_where=ANALYZER_ROWS,
+        sqlite_where=ANALYZER_ROWS,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ux_entity_risk_history_analyzer_window', table_name='entity_risk_history')
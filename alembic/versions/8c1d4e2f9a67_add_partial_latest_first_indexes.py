@@ -0,0 +1,73 @@
+"""Add partial latest-first indexes for per-entity lookups
+
+Revision ID: 8c1d4e2f9a67
+Revises: ed0abddeb8b3
+Create Date: 2025-12-02 09:41:12.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c1d4e2f9a67'
+down_revision: Union[str, None] = 'ed0abddeb8b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+ACTIVE_ROWS = sa.text('deleted_at IS NULL')
+
+
+def upgrade() -> None:
+    # CONCURRENTLY cannot run inside a transaction on PostgreSQL.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_entity_risk_history_entity_observed_active',
+            'entity_risk_history',
+            ['entity_id', sa.text('observed_at DESC')],
+            unique=False,
+            postgresql_where=ACTIVE_ROWS,
+            sqlite_where=ACTIVE_ROWS,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_normalized_events_entity_observed_active',
+            'normalized_events',
+            ['entity_id', sa.text('observed_at DESC')],
+            unique=False,
+            postgresql_where=ACTIVE_ROWS,
+            sqlite_where=ACTIVE_ROWS,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_tp_fp_feedback_entity_submitted_active',
+            'tp_fp_feedback',
+            ['entity_id', sa.text('submitted_at DESC')],
+            unique=False,
+            postgresql_where=ACTIVE_ROWS,
+            sqlite_where=ACTIVE_ROWS,
+            postgresql_concurrently=True,
+        )
+        # Every risk history lookup filters out soft-deleted rows, so the partial index supersedes it.
+        op.drop_index(
+            'ix_entity_risk_history_entity_observed',
+            table_name='entity_risk_history',
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    op.create_index(
+        'ix_entity_risk_history_entity_observed',
+        'entity_risk_history',
+        ['entity_id', 'observed_at'],
+        unique=False,
+    )
+    op.drop_index('ix_tp_fp_feedback_entity_submitted_active', table_name='tp_fp_feedback')
+    op.drop_index('ix_normalized_events_entity_observed_active', table_name='normalized_events')
+    op.drop_index(
+        'ix_entity_risk_history_entity_observed_active', table_name='entity_risk_history'
+    )
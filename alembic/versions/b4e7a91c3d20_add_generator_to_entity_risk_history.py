@@ -0,0 +1,49 @@
+"""Add generator to entity_risk_history
+
+Revision ID: b4e7a91c3d20
+Revises: 8c1d4e2f9a67
+Create Date: 2025-12-03 14:05:37.402911
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4e7a91c3d20'
+down_revision: Union[str, None] = '8c1d4e2f9a67'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+ACTIVE_ROWS = sa.text('deleted_at IS NULL')
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('entity_risk_history', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('generator', sa.String(length=64), nullable=True))
+
+    # Backfill from the serialized reason payload written by the analyzer.
+    op.execute(
+        "UPDATE entity_risk_history SET generator = 'analyzer_service' "
+        "WHERE reason LIKE '%\"generator\": \"analyzer_service\"%'"
+    )
+
+    op.create_index(
+        'ix_entity_risk_history_generator_observed_active',
+        'entity_risk_history',
+        ['generator', sa.text('observed_at DESC')],
+        unique=False,
+        postgresql_where=ACTIVE_ROWS,
+        sqlite_where=ACTIVE_ROWS,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        'ix_entity_risk_history_generator_observed_active', table_name='entity_risk_history'
+    )
+    with op.batch_alter_table('entity_risk_history', schema=None) as batch_op:
+        batch_op.drop_column('generator')
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
+import hmac
 import os
+from functools import lru_cache
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
@@ -9,8 +11,9 @@ from fastapi.security import HTTPBasic, HTTPBasicCredentials
 security = HTTPBasic()
 
 
-def get_api_credentials() -> tuple[str, str]:
-    """Get API credentials from environment variables."""
+@lru_cache()
+def _load_credentials() -> tuple[bytes, bytes]:
+    """Read API credentials from the environment once and cache them UTF-8 encoded."""
     username = os.getenv("UEBA_DASH_USERNAME")
     password = os.getenv("UEBA_DASH_PASSWORD")
 
@@ -19,17 +22,29 @@ def get_api_credentials() -> tuple[str, str]:
             "UEBA_DASH_USERNAME and UEBA_DASH_PASSWORD environment variables must be set"
         )
 
-    return username, password
+    return username.encode("utf-8"), password.encode("utf-8")
 
 
-def verify_credentials(credentials: HTTPBasicCredentials = Depends(security)) -> str:
-    """Verify HTTP Basic Auth credentials against environment variables."""
-    expected_username, expected_password = get_api_credentials()
+def get_api_credentials() -> tuple[str, str]:
+    """Get API credentials from environment variables."""
+    username, password = _load_credentials()
+    return username.decode("utf-8"), password.decode("utf-8")
 
-    is_username_correct = credentials.username == expected_username
-    is_password_correct = credentials.password == expected_password
 
-    if not (is_username_correct and is_password_correct):
+def credentials_match(username: str, password: str) -> bool:
+    """Check a username/password pair against the configured credentials in constant time."""
+    expected_username, expected_password = _load_credentials()
+
+    # compare_digest keeps the comparison time independent of where the inputs differ,
+    # and the bitwise & ensures both comparisons always run.
+    is_username_correct = hmac.compare_digest(username.encode("utf-8"), expected_username)
+    is_password_correct = hmac.compare_digest(password.encode("utf-8"), expected_password)
+    return is_username_correct & is_password_correct
+
+
+def verify_credentials(credentials: HTTPBasicCredentials = Depends(security)) -> str:
+    """Verify HTTP Basic Auth credentials against environment variables."""
+    if not credentials_match(credentials.username, credentials.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials",
@@ -1,24 +1,36 @@
 from __future__ import annotations
 
+from functools import lru_cache
 from typing import Generator
 
-from fastapi import Depends
-from sqlalchemy.orm import Session, scoped_session
+from fastapi import HTTPException, status
+from sqlalchemy import lambda_stmt, select
+from sqlalchemy.orm import Session, sessionmaker
 
-from ueba.db.base import get_session_factory
+from ueba.db.base import get_engine
+from ueba.db.models import Entity
 
 
-def get_session_factory_instance() -> scoped_session:
-    """Return the global session factory."""
-    return get_session_factory()
+@lru_cache()
+def _get_sessionmaker() -> sessionmaker:
+    """Return the process-wide session factory for API requests."""
+    return sessionmaker(bind=get_engine(), autocommit=False, autoflush=False, future=True)
 
 
-def get_session(
-    factory: scoped_session = Depends(get_session_factory_instance),
-) -> Generator[Session, None, None]:
+def get_session() -> Generator[Session, None, None]:
     """Provide a database session for each request."""
-    session = factory()
+    session = _get_sessionmaker()()
     try:
         yield session
     finally:
         session.close()
+
+
+def ensure_entity_exists(session: Session, entity_id: int) -> None:
+    """Raise 404 unless an active entity with this id exists."""
+    # lambda_stmt caches the compiled SQL; entity_id is extracted as a bound parameter.
+    stmt = lambda_stmt(
+        lambda: select(Entity.id).where(Entity.id == entity_id, Entity.deleted_at.is_(None))
+    )
+    if session.execute(stmt).first() is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Entity not found")
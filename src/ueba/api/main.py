@@ -1,23 +1,41 @@
 from __future__ import annotations
 
+import hashlib
 import os
 import secrets
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
+from functools import lru_cache
+from typing import AsyncIterator
 
+import anyio
 from fastapi import FastAPI, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from jinja2 import Environment, FileSystemLoader
 from pydantic import BaseModel
 
-from ueba.api.auth import get_api_credentials
+from ueba.api.auth import credentials_match
 from ueba.api.routers import entities, events, feedback, health
+from ueba.utils import TTLCache, get_env_int, json_codec
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Size the worker threadpool that runs the synchronous DB-bound handlers."""
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    limiter.total_tokens = get_env_int("UEBA_API_THREADPOOL_SIZE", 40)
+    yield
+
 
 app = FastAPI(
     title="UEBA Dashboard API",
     description="Backend API for UEBA User and Entity Behavior Analytics Dashboard",
     version="0.1.0",
+    lifespan=lifespan,
+    # orjson is an optional speedup; fall back to the stdlib encoder without it.
+    default_response_class=ORJSONResponse if json_codec.HAS_ORJSON else JSONResponse,
 )
 
 # Add CORS middleware for development
@@ -39,9 +57,16 @@ template_path = os.path.join(os.path.dirname(__file__), '../../..', 'templates')
 jinja_env = Environment(
     loader=FileSystemLoader(template_path),
     autoescape=True,
+    auto_reload=False,
 )
 
 
+@lru_cache(maxsize=1)
+def _render_dashboard() -> bytes:
+    """Render and encode dashboard.html once; the template takes no per-request context."""
+    return jinja_env.get_template("dashboard.html").render().encode("utf-8")
+
+
 class LoginRequest(BaseModel):
     """Request model for login endpoint."""
     username: str
@@ -54,8 +79,17 @@ class LoginResponse(BaseModel):
     message: str
 
 
-# Session token storage (in production, use Redis or database)
-_session_tokens = {}
+# Session token storage (in production, use Redis or database).
+# Keyed by a digest of the token so raw secrets are not kept in memory.
+_session_tokens: TTLCache[bytes, dict] = TTLCache(
+    maxsize=get_env_int("UEBA_SESSION_MAX_TOKENS", 10_000),
+    ttl=get_env_int("UEBA_SESSION_TTL_SECONDS", 3600),
+)
+
+
+def _session_key(session_token: str) -> bytes:
+    """Hash a session token into its fixed-size storage key."""
+    return hashlib.blake2b(session_token.encode("utf-8"), digest_size=16).digest()
 
 
 @app.post("/login", response_model=LoginResponse)
@@ -66,9 +100,7 @@ def login(request: LoginRequest) -> LoginResponse:
     Validates credentials against environment variables and returns a session token
     that can be used in subsequent requests via Bearer token or stored as a cookie.
     """
-    expected_username, expected_password = get_api_credentials()
-
-    if request.username != expected_username or request.password != expected_password:
+    if not credentials_match(request.username, request.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid username or password",
@@ -76,7 +108,7 @@ def login(request: LoginRequest) -> LoginResponse:
 
     # Generate a secure session token
     session_token = secrets.token_urlsafe(32)
-    _session_tokens[session_token] = {
+    _session_tokens[_session_key(session_token)] = {
         "username": request.username,
         "created_at": datetime.now(timezone.utc),
     }
@@ -95,11 +127,12 @@ def dashboard():
     This is the main dashboard interface that loads from templates/dashboard.html.
     """
     try:
-        template = jinja_env.get_template("dashboard.html")
-        html_content = template.render()
-        return html_content
+        return HTMLResponse(content=_render_dashboard())
     except Exception as e:
-        return f"<h1>Error loading dashboard: {str(e)}</h1>", 500
+        return HTMLResponse(
+            content=f"<h1>Error loading dashboard: {str(e)}</h1>",
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
 
 
 # Include routers
@@ -0,0 +1,18 @@
+from __future__ import annotations
+
+from fastapi import Response, status
+from pydantic import BaseModel
+
+
+def model_response(model: BaseModel, status_code: int = status.HTTP_200_OK) -> Response:
+    """
+    Serialize a response model built from trusted rows straight to JSON.
+
+    Returning a Response lets FastAPI skip validating the payload a second time, while
+    the route's response_model still documents the schema.
+    """
+    return Response(
+        content=model.model_dump_json(),
+        media_type="application/json",
+        status_code=status_code,
+    )
@@ -1,158 +1,193 @@
 from __future__ import annotations
 
-import json
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy import func, select
+from fastapi import APIRouter, Depends, Query, Response
+from sqlalchemy import Select, func, select
 from sqlalchemy.orm import Session
 
 from ueba.api.auth import verify_credentials
-from ueba.api.dependencies import get_session
+from ueba.api.dependencies import ensure_entity_exists, get_session
+from ueba.api.responses import model_response
 from ueba.api.schemas import EntityRosterItem, EntityRosterResponse, RiskHistoryItem, RiskHistoryResponse
 from ueba.db.models import Entity, EntityRiskHistory, TPFPFeedback
+from ueba.utils import TTLCache, get_env_int, json_codec
 
 router = APIRouter(prefix="/api/v1/entities", tags=["entities"], dependencies=[Depends(verify_credentials)])
 
+# total_count is a full aggregate over entities and only needs to be roughly current for paging.
+_entity_count_cache: TTLCache[str, int] = TTLCache(
+    maxsize=1, ttl=get_env_int("UEBA_ENTITY_COUNT_CACHE_TTL_SECONDS", 60)
+)
+
 
 def _parse_reason_json(reason_str: Optional[str]) -> dict:
     """Parse reason JSON payload, return empty dict if invalid."""
     if not reason_str:
         return {}
     try:
-        return json.loads(reason_str)
-    except (json.JSONDecodeError, TypeError):
+        return json_codec.loads(reason_str)
+    except (json_codec.JSONDecodeError, TypeError):
         return {}
 
 
-def _get_latest_entity_risk(
-    session: Session, entity_id: int
-) -> Optional[tuple[float, Optional[dict]]]:
-    """Get latest risk score and reason for an entity, returns (score, reason_dict)."""
-    stmt = (
-        select(EntityRiskHistory.risk_score, EntityRiskHistory.reason)
+def _roster_page_stmt(limit: int, after_id: Optional[int] = None, offset: int = 0) -> Select:
+    """
+    Build one statement returning a roster page with latest risk and TP/FP counts.
+
+    The page of entities, each entity's latest history row and its feedback counts are
+    CTEs restricted to the page's ids and LEFT JOINed, so the roster is a single round-trip.
+    With ``after_id`` the page starts with a primary-key seek instead of skipping rows.
+    """
+    page = (
+        select(Entity.id, Entity.entity_type, Entity.entity_value, Entity.display_name)
+        .where(Entity.deleted_at.is_(None))
+        .order_by(Entity.id)
+    )
+    if after_id is not None:
+        page = page.where(Entity.id > after_id)
+    elif offset:
+        page = page.offset(offset)
+    page = page.limit(limit).cte("page")
+    page_ids = select(page.c.id)
+
+    ranked = (
+        select(
+            EntityRiskHistory.entity_id,
+            EntityRiskHistory.risk_score,
+            EntityRiskHistory.reason,
+            EntityRiskHistory.observed_at,
+            func.row_number()
+            .over(
+                partition_by=EntityRiskHistory.entity_id,
+                order_by=EntityRiskHistory.observed_at.desc(),
+            )
+            .label("rank"),
+        )
         .where(
-            EntityRiskHistory.entity_id == entity_id,
+            EntityRiskHistory.entity_id.in_(page_ids),
             EntityRiskHistory.deleted_at.is_(None),
         )
-        .order_by(EntityRiskHistory.observed_at.desc())
-        .limit(1)
+        .cte("ranked")
     )
-    result = session.execute(stmt).first()
-    if result:
-        return result[0], _parse_reason_json(result[1])
-    return None
 
-
-def _get_feedback_stats(session: Session, entity_id: int) -> tuple[int, int, float]:
-    """Get TP/FP counts and ratio for an entity. Returns (tp_count, fp_count, fp_ratio)."""
-    stmt = (
+    feedback = (
         select(
-            func.count().filter(TPFPFeedback.feedback_type == "tp"),
-            func.count().filter(TPFPFeedback.feedback_type == "fp"),
+            TPFPFeedback.entity_id,
+            func.count().filter(TPFPFeedback.feedback_type == "tp").label("tp_count"),
+            func.count().filter(TPFPFeedback.feedback_type == "fp").label("fp_count"),
         )
         .where(
-            TPFPFeedback.entity_id == entity_id,
+            TPFPFeedback.entity_id.in_(page_ids),
             TPFPFeedback.deleted_at.is_(None),
         )
+        .group_by(TPFPFeedback.entity_id)
+        .cte("feedback")
     )
-    result = session.execute(stmt).first()
-    tp_count = result[0] if result[0] is not None else 0
-    fp_count = result[1] if result[1] is not None else 0
 
-    total = tp_count + fp_count
-    fp_ratio = (fp_count / total) if total > 0 else 0.0
+    return (
+        select(
+            page.c.id,
+            page.c.entity_type,
+            page.c.entity_value,
+            page.c.display_name,
+            ranked.c.risk_score,
+            ranked.c.reason,
+            ranked.c.observed_at,
+            feedback.c.tp_count,
+            feedback.c.fp_count,
+        )
+        .select_from(page)
+        .outerjoin(ranked, (ranked.c.entity_id == page.c.id) & (ranked.c.rank == 1))
+        .outerjoin(feedback, feedback.c.entity_id == page.c.id)
+        .order_by(page.c.id)
+    )
 
-    return tp_count, fp_count, fp_ratio
+
+def _count_entities(session: Session) -> int:
+    """Count active entities, reusing a recent result while it is fresh."""
+    total_count = _entity_count_cache.get("total")
+    if total_count is None:
+        count_stmt = select(func.count(Entity.id)).where(Entity.deleted_at.is_(None))
+        total_count = session.execute(count_stmt).scalar() or 0
+        _entity_count_cache["total"] = total_count
+    return total_count
 
 
 @router.get("", response_model=EntityRosterResponse)
 def list_entities(
     session: Session = Depends(get_session),
-    page: int = Query(1, ge=1),
+    page: int = Query(1, ge=1, description="Deprecated: use after_entity_id/next_cursor"),
     page_size: int = Query(50, ge=1, le=500),
-) -> EntityRosterResponse:
+    after_entity_id: Optional[int] = Query(None, ge=0),
+) -> Response:
     """
     Get paginated roster of entities with latest risk scores and analysis.
     
-    Uses efficient queries with joins to avoid per-entity lookups.
+    Entities, latest risk and feedback stats for the page come back in one query.
+    Pass the previous response's ``next_cursor`` as ``after_entity_id`` to fetch the
+    next page; ``page`` is still honoured when no cursor is given.
     """
-    # Count total entities
-    count_stmt = select(func.count(Entity.id)).where(Entity.deleted_at.is_(None))
-    total_count = session.execute(count_stmt).scalar() or 0
-
-    # Fetch entities with pagination
-    offset = (page - 1) * page_size
-    entity_stmt = (
-        select(Entity)
-        .where(Entity.deleted_at.is_(None))
-        .order_by(Entity.id)
-        .offset(offset)
-        .limit(page_size)
-    )
-    entities = session.execute(entity_stmt).scalars().all()
+    total_count = _count_entities(session)
 
-    items = []
-    for entity in entities:
-        risk_data = _get_latest_entity_risk(session, entity.id)
+    offset = 0 if after_entity_id is not None else (page - 1) * page_size
+
+    # One extra row tells whether another page follows without a second query.
+    rows = session.execute(
+        _roster_page_stmt(page_size + 1, after_id=after_entity_id, offset=offset)
+    ).all()
+    next_cursor = rows[page_size - 1].id if len(rows) > page_size else None
 
-        latest_risk_score = None
+    items = []
+    for row in rows[:page_size]:
         baseline_avg = None
         baseline_sigma = None
         delta = None
         is_anomalous = False
         triggered_rules = []
 
-        if risk_data:
-            latest_risk_score, reason_dict = risk_data
-            if reason_dict:
-                baseline = reason_dict.get("baseline", {})
-                baseline_avg = baseline.get("avg")
-                baseline_sigma = baseline.get("sigma")
-                delta = baseline.get("delta")
-                is_anomalous = baseline.get("is_anomalous", False)
-
-                rules = reason_dict.get("rules", {})
-                triggered_rules = rules.get("triggered", [])
-
-        # Get last observed time from EntityRiskHistory
-        last_observed_stmt = (
-            select(EntityRiskHistory.observed_at)
-            .where(
-                EntityRiskHistory.entity_id == entity.id,
-                EntityRiskHistory.deleted_at.is_(None),
-            )
-            .order_by(EntityRiskHistory.observed_at.desc())
-            .limit(1)
-        )
-        last_observed = session.execute(last_observed_stmt).scalar()
-
-        # Get feedback stats
-        tp_count, fp_count, fp_ratio = _get_feedback_stats(session, entity.id)
-
-        item = EntityRosterItem(
-            entity_id=entity.id,
-            entity_type=entity.entity_type,
-            entity_value=entity.entity_value,
-            display_name=entity.display_name,
-            latest_risk_score=latest_risk_score,
+        reason_dict = _parse_reason_json(row.reason)
+        if reason_dict:
+            baseline = reason_dict.get("baseline", {})
+            baseline_avg = baseline.get("avg")
+            baseline_sigma = baseline.get("sigma")
+            delta = baseline.get("delta")
+            is_anomalous = bool(baseline.get("is_anomalous"))
+
+            rules = reason_dict.get("rules", {})
+            triggered_rules = rules.get("triggered") or []
+
+        tp_count = row.tp_count or 0
+        fp_count = row.fp_count or 0
+        total = tp_count + fp_count
+        fp_ratio = (fp_count / total) if total > 0 else 0.0
+
+        item = EntityRosterItem.model_construct(
+            entity_id=row.id,
+            entity_type=row.entity_type,
+            entity_value=row.entity_value,
+            display_name=row.display_name,
+            latest_risk_score=row.risk_score,
             baseline_avg=baseline_avg,
             baseline_sigma=baseline_sigma,
             delta=delta,
             is_anomalous=is_anomalous,
             triggered_rules=triggered_rules,
-            last_observed_at=last_observed,
+            last_observed_at=row.observed_at,
             tp_count=tp_count,
             fp_count=fp_count,
             fp_ratio=fp_ratio,
         )
         items.append(item)
 
-    return EntityRosterResponse(
-        total_count=total_count,
-        page=page,
-        page_size=page_size,
-        items=items,
+    return model_response(
+        EntityRosterResponse.model_construct(
+            total_count=total_count,
+            page=page,
+            page_size=page_size,
+            items=items,
+            next_cursor=next_cursor,
+        )
     )
 
 
@@ -161,21 +196,22 @@ def get_entity_history(
     entity_id: int,
     session: Session = Depends(get_session),
     limit: int = Query(100, ge=1, le=1000),
-) -> RiskHistoryResponse:
+) -> Response:
     """
     Get risk history windows for an entity.
     
     Returns the most recent history records up to the specified limit.
     """
     # Verify entity exists
-    entity_stmt = select(Entity).where(Entity.id == entity_id, Entity.deleted_at.is_(None))
-    entity = session.execute(entity_stmt).scalar_one_or_none()
-    if not entity:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Entity not found")
+    ensure_entity_exists(session, entity_id)
 
     # Fetch history
     history_stmt = (
-        select(EntityRiskHistory)
+        select(
+            EntityRiskHistory.observed_at,
+            EntityRiskHistory.risk_score,
+            EntityRiskHistory.reason,
+        )
         .where(
             EntityRiskHistory.entity_id == entity_id,
             EntityRiskHistory.deleted_at.is_(None),
@@ -183,22 +219,20 @@ def get_entity_history(
         .order_by(EntityRiskHistory.observed_at.desc())
         .limit(limit)
     )
-    records = session.execute(history_stmt).scalars().all()
-
     items = []
-    for record in records:
-        reason_dict = _parse_reason_json(record.reason)
+    for observed_at, risk_score, reason in session.execute(history_stmt):
+        reason_dict = _parse_reason_json(reason)
         baseline = reason_dict.get("baseline", {})
 
-        item = RiskHistoryItem(
-            observed_at=record.observed_at,
-            risk_score=record.risk_score,
+        item = RiskHistoryItem.model_construct(
+            observed_at=observed_at,
+            risk_score=risk_score,
             baseline_avg=baseline.get("avg"),
             baseline_sigma=baseline.get("sigma"),
             delta=baseline.get("delta"),
-            is_anomalous=baseline.get("is_anomalous", False),
-            triggered_rules=reason_dict.get("rules", {}).get("triggered", []),
+            is_anomalous=bool(baseline.get("is_anomalous")),
+            triggered_rules=reason_dict.get("rules", {}).get("triggered") or [],
         )
         items.append(item)
 
-    return RiskHistoryResponse(entity_id=entity_id, items=items)
+    return model_response(RiskHistoryResponse.model_construct(entity_id=entity_id, items=items))
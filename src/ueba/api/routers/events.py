@@ -1,13 +1,14 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, Query, Response
 from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 
 from ueba.api.auth import verify_credentials
-from ueba.api.dependencies import get_session
+from ueba.api.dependencies import ensure_entity_exists, get_session
+from ueba.api.responses import model_response
 from ueba.api.schemas import EventsResponse, NormalizedEventItem
-from ueba.db.models import Entity, NormalizedEvent
+from ueba.db.models import NormalizedEvent
 
 router = APIRouter(prefix="/api/v1/entities", tags=["events"], dependencies=[Depends(verify_credentials)])
 
@@ -17,17 +18,14 @@ def get_entity_events(
     entity_id: int,
     session: Session = Depends(get_session),
     limit: int = Query(100, ge=1, le=1000),
-) -> EventsResponse:
+) -> Response:
     """
     Get recent normalized events for an entity.
     
     Returns the most recent events up to the specified limit.
     """
     # Verify entity exists
-    entity_stmt = select(Entity).where(Entity.id == entity_id, Entity.deleted_at.is_(None))
-    entity = session.execute(entity_stmt).scalar_one_or_none()
-    if not entity:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Entity not found")
+    ensure_entity_exists(session, entity_id)
 
     # Count total events
     count_stmt = select(func.count(NormalizedEvent.id)).where(
@@ -49,7 +47,7 @@ def get_entity_events(
     events = session.execute(events_stmt).scalars().all()
 
     items = [
-        NormalizedEventItem(
+        NormalizedEventItem.model_construct(
             event_id=event.id,
             event_type=event.event_type,
             observed_at=event.observed_at,
@@ -60,4 +58,6 @@ def get_entity_events(
         for event in events
     ]
 
-    return EventsResponse(entity_id=entity_id, total_count=total_count, items=items)
+    return model_response(
+        EventsResponse.model_construct(entity_id=entity_id, total_count=total_count, items=items)
+    )
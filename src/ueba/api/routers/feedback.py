@@ -1,34 +1,24 @@
 from __future__ import annotations
 
-from typing import Optional
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy import func, select
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import func, lambda_stmt, select
 from sqlalchemy.orm import Session
 
 from ueba.api.auth import verify_credentials
-from ueba.api.dependencies import get_session
+from ueba.api.dependencies import ensure_entity_exists, get_session
+from ueba.api.responses import model_response
 from ueba.api.schemas import FeedbackResponse, FeedbackStats, FeedbackSubmissionRequest, FeedbackItem
-from ueba.db.models import Entity, NormalizedEvent, TPFPFeedback
+from ueba.db.models import NormalizedEvent, TPFPFeedback
 
 router = APIRouter(prefix="/api/v1/entities", tags=["feedback"], dependencies=[Depends(verify_credentials)])
 
 
-def _get_feedback_stats(session: Session, entity_id: int) -> FeedbackStats:
-    """Calculate TP/FP stats for an entity."""
-    stmt = (
-        select(
-            func.count().filter(TPFPFeedback.feedback_type == "tp"),
-            func.count().filter(TPFPFeedback.feedback_type == "fp"),
-        )
-        .where(
-            TPFPFeedback.entity_id == entity_id,
-            TPFPFeedback.deleted_at.is_(None),
-        )
-    )
-    result = session.execute(stmt).first()
-    tp_count = result[0] if result[0] is not None else 0
-    fp_count = result[1] if result[1] is not None else 0
+def _build_feedback_stats(tp_count: Optional[int], fp_count: Optional[int]) -> FeedbackStats:
+    """Build TP/FP stats from raw counts."""
+    tp_count = tp_count or 0
+    fp_count = fp_count or 0
 
     total = tp_count + fp_count
     fp_ratio = (fp_count / total) if total > 0 else 0.0
@@ -36,26 +26,21 @@ def _get_feedback_stats(session: Session, entity_id: int) -> FeedbackStats:
     return FeedbackStats(tp_count=tp_count, fp_count=fp_count, fp_ratio=fp_ratio)
 
 
-@router.get("/{entity_id}/feedback", response_model=FeedbackResponse)
-def get_feedback(
-    entity_id: int,
-    session: Session = Depends(get_session),
-    limit: int = Query(100, ge=1, le=1000),
-) -> FeedbackResponse:
+def _get_feedback_page(
+    session: Session, entity_id: int, limit: int
+) -> tuple[List[FeedbackItem], FeedbackStats]:
     """
-    Get feedback history and statistics for an entity.
+    Fetch recent feedback and TP/FP stats for an entity in one query.
 
-    Returns recent feedback submissions and aggregated TP/FP stats.
+    The counts are window aggregates over every active row, so they are computed
+    before LIMIT trims the page.
     """
-    # Verify entity exists
-    entity_stmt = select(Entity).where(Entity.id == entity_id, Entity.deleted_at.is_(None))
-    entity = session.execute(entity_stmt).scalar_one_or_none()
-    if not entity:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Entity not found")
-
-    # Fetch feedback history
-    feedback_stmt = (
-        select(TPFPFeedback)
+    stmt = lambda_stmt(
+        lambda: select(
+            TPFPFeedback,
+            func.count().filter(TPFPFeedback.feedback_type == "tp").over(),
+            func.count().filter(TPFPFeedback.feedback_type == "fp").over(),
+        )
         .where(
             TPFPFeedback.entity_id == entity_id,
             TPFPFeedback.deleted_at.is_(None),
@@ -63,10 +48,12 @@ def get_feedback(
         .order_by(TPFPFeedback.submitted_at.desc())
         .limit(limit)
     )
-    feedback_records = session.execute(feedback_stmt).scalars().all()
+    rows = session.execute(stmt).all()
+    if not rows:
+        return [], _build_feedback_stats(0, 0)
 
     items = [
-        FeedbackItem(
+        FeedbackItem.model_construct(
             feedback_id=record.id,
             feedback_type=record.feedback_type,
             normalized_event_id=record.normalized_event_id,
@@ -74,12 +61,30 @@ def get_feedback(
             submitted_by=record.submitted_by,
             submitted_at=record.submitted_at,
         )
-        for record in feedback_records
+        for record, _, _ in rows
     ]
+    _, tp_count, fp_count = rows[0]
+
+    return items, _build_feedback_stats(tp_count, fp_count)
+
+
+@router.get("/{entity_id}/feedback", response_model=FeedbackResponse)
+def get_feedback(
+    entity_id: int,
+    session: Session = Depends(get_session),
+    limit: int = Query(100, ge=1, le=1000),
+) -> Response:
+    """
+    Get feedback history and statistics for an entity.
+
+    Returns recent feedback submissions and aggregated TP/FP stats.
+    """
+    # Verify entity exists
+    ensure_entity_exists(session, entity_id)
 
-    stats = _get_feedback_stats(session, entity_id)
+    items, stats = _get_feedback_page(session, entity_id, limit)
 
-    return FeedbackResponse(entity_id=entity_id, items=items, stats=stats)
+    return model_response(FeedbackResponse.model_construct(entity_id=entity_id, items=items, stats=stats))
 
 
 @router.post("/{entity_id}/feedback", response_model=FeedbackResponse, status_code=status.HTTP_201_CREATED)
@@ -88,7 +93,7 @@ def submit_feedback(
     request: FeedbackSubmissionRequest,
     session: Session = Depends(get_session),
     username: str = Depends(verify_credentials),
-) -> FeedbackResponse:
+) -> Response:
     """
     Submit feedback (TP/FP marking) for an entity.
 
@@ -96,10 +101,7 @@ def submit_feedback(
     updated TP/FP counts and false-positive ratio for real-time UI updates.
     """
     # Verify entity exists
-    entity_stmt = select(Entity).where(Entity.id == entity_id, Entity.deleted_at.is_(None))
-    entity = session.execute(entity_stmt).scalar_one_or_none()
-    if not entity:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Entity not found")
+    ensure_entity_exists(session, entity_id)
 
     # Validate feedback_type
     if request.feedback_type not in ("tp", "fp"):
@@ -110,14 +112,11 @@ def submit_feedback(
 
     # If normalized_event_id is provided, verify it exists
     if request.normalized_event_id:
-        event_stmt = (
-            select(NormalizedEvent).where(
-                NormalizedEvent.id == request.normalized_event_id,
-                NormalizedEvent.deleted_at.is_(None),
-            )
+        event_stmt = select(NormalizedEvent.id).where(
+            NormalizedEvent.id == request.normalized_event_id,
+            NormalizedEvent.deleted_at.is_(None),
         )
-        event = session.execute(event_stmt).scalar_one_or_none()
-        if not event:
+        if session.execute(event_stmt).first() is None:
             raise HTTPException(
                 status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
                 detail=f"Normalized event {request.normalized_event_id} not found",
@@ -134,30 +133,10 @@ def submit_feedback(
     session.add(feedback)
     session.commit()
 
-    # Fetch updated feedback history
-    feedback_stmt = (
-        select(TPFPFeedback)
-        .where(
-            TPFPFeedback.entity_id == entity_id,
-            TPFPFeedback.deleted_at.is_(None),
-        )
-        .order_by(TPFPFeedback.submitted_at.desc())
-        .limit(100)
-    )
-    feedback_records = session.execute(feedback_stmt).scalars().all()
-
-    items = [
-        FeedbackItem(
-            feedback_id=record.id,
-            feedback_type=record.feedback_type,
-            normalized_event_id=record.normalized_event_id,
-            notes=record.notes,
-            submitted_by=record.submitted_by,
-            submitted_at=record.submitted_at,
-        )
-        for record in feedback_records
-    ]
-
-    stats = _get_feedback_stats(session, entity_id)
+    # Fetch updated feedback history and stats
+    items, stats = _get_feedback_page(session, entity_id, 100)
 
-    return FeedbackResponse(entity_id=entity_id, items=items, stats=stats)
+    return model_response(
+        FeedbackResponse.model_construct(entity_id=entity_id, items=items, stats=stats),
+        status_code=status.HTTP_201_CREATED,
+    )
@@ -10,10 +10,16 @@ from ueba.api.auth import verify_credentials
 from ueba.api.dependencies import get_session
 from ueba.api.schemas import HealthResponse, SettingsResponse
 from ueba.db.models import EntityRiskHistory
+from ueba.utils import TTLCache
 from ueba.utils.env import get_env_float, get_env_int
 
 router = APIRouter(tags=["health"])
 
+# The last analyzer run only moves when the analyzer writes history, so UI polls can share a result.
+_settings_cache: TTLCache[str, SettingsResponse] = TTLCache(
+    maxsize=1, ttl=get_env_int("UEBA_SETTINGS_CACHE_TTL_SECONDS", 30)
+)
+
 
 @router.get("/health", response_model=HealthResponse)
 def health_check(
@@ -47,7 +53,12 @@ def get_settings(
     Get UI settings and system configuration.
     
     Returns baseline window, sigma multiplier, and last analyzer run timestamp.
+    The response is cached briefly since it changes at most once per analyzer run.
     """
+    cached = _settings_cache.get("settings")
+    if cached is not None:
+        return cached
+
     sigma_multiplier = get_env_float("UEBA_SIGMA_MULTIPLIER", 3.0)
     baseline_window_days = get_env_int("UEBA_BASELINE_WINDOW_DAYS", 30)
 
@@ -55,8 +66,7 @@ def get_settings(
     last_run_stmt = (
         select(EntityRiskHistory.observed_at)
         .where(
-            EntityRiskHistory.reason.is_not(None),
-            EntityRiskHistory.reason.contains('"generator": "analyzer_service"'),
+            EntityRiskHistory.generator == "analyzer_service",
             EntityRiskHistory.deleted_at.is_(None),
         )
         .order_by(EntityRiskHistory.observed_at.desc())
@@ -64,8 +74,10 @@ def get_settings(
     )
     last_run_at = session.execute(last_run_stmt).scalar_one_or_none()
 
-    return SettingsResponse(
+    settings = SettingsResponse(
         sigma_multiplier=sigma_multiplier,
         baseline_window_days=baseline_window_days,
         last_analyzer_run_at=last_run_at,
     )
+    _settings_cache["settings"] = settings
+    return settings
@@ -35,6 +35,8 @@ class EntityRosterResponse(BaseModel):
     page: int
     page_size: int
     items: List[EntityRosterItem]
+    # Pass as ``after_entity_id`` to fetch the next page; None on the last page.
+    next_cursor: Optional[int] = None
 
 
 class RiskHistoryItem(BaseModel):
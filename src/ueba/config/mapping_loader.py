@@ -3,8 +3,9 @@ from __future__ import annotations
 import os
 from dataclasses import dataclass, field
 from enum import Enum
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Sequence
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 
 import yaml
 
@@ -253,11 +254,16 @@ class MappingContext:
 
 
 class MappingResolver:
+    # Distinct (source, rule, groups, custom) combinations remembered by ``lookup``.
+    LOOKUP_CACHE_SIZE = 4096
+
     def __init__(self, layers: Sequence[MappingLayer]):
         indexed = list(enumerate(layers))
         indexed.sort(key=lambda item: (item[1].priority.order, item[0]))
         self._layers = [layer for _, layer in indexed]
         self._validate_baseline()
+        # Layers are fixed after loading, so resolution is a pure function of the context.
+        self._resolve_cached = lru_cache(maxsize=self.LOOKUP_CACHE_SIZE)(self._resolve_key)
 
     def _validate_baseline(self) -> None:
         ctx = MappingContext.from_inputs()
@@ -283,6 +289,16 @@ class MappingResolver:
         custom: Optional[Dict[str, str]] = None,
     ) -> ResolvedMapping:
         ctx = MappingContext.from_inputs(source=source, rule_id=rule_id, groups=groups, custom=custom)
+        key = (ctx.source, ctx.rule_id, ctx.groups, tuple(sorted(ctx.custom.items())))
+        # Hand out a copy so callers cannot alter the cached mapping.
+        return self._resolve_cached(key).copy()
+
+    def _resolve_key(
+        self,
+        key: Tuple[Optional[str], Optional[str], Tuple[str, ...], Tuple[Tuple[str, str], ...]],
+    ) -> ResolvedMapping:
+        source, rule_id, groups, custom = key
+        ctx = MappingContext(source=source, rule_id=rule_id, groups=groups, custom=dict(custom))
         resolved = ResolvedMapping()
         for layer in self._layers:
             resolved = layer.apply(ctx, resolved)
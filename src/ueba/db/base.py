@@ -1,27 +1,70 @@
 from __future__ import annotations
 
 import os
+from contextlib import contextmanager
 from functools import lru_cache
-from typing import Optional
+from typing import Iterator, Optional
 
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, scoped_session, sessionmaker
+from sqlalchemy import create_engine, event, make_url
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from ueba.utils import get_env_int, json_codec
 
 load_dotenv()
 
 Base = declarative_base()
 
 
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """Switch a file-backed SQLite connection to WAL journaling with NORMAL sync.
+
+    Opt-in through ``UEBA_SQLITE_WAL=1``: readers stop blocking the writer, but a power
+    loss can drop the last commits and the database gains ``-wal``/``-shm`` side files.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
 def _create_engine(database_url: str):
-    connect_args = {}
-    if database_url.startswith("sqlite"):
-        connect_args = {"check_same_thread": False}
+    url = make_url(database_url)
+    # Rows per multi-VALUES statement when executemany() batches INSERT ... RETURNING.
+    insert_page_size = get_env_int("UEBA_DB_INSERT_PAGE_SIZE", 1000)
+    if url.get_backend_name() == "sqlite":
+        in_memory = url.database in (None, "", ":memory:")
+        engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False},
+            future=True,
+            json_serializer=json_codec.dumps,
+            json_deserializer=json_codec.loads,
+            pool_pre_ping=True,
+            insertmanyvalues_page_size=insert_page_size,
+            # An in-memory database only lives as long as its connection.
+            poolclass=StaticPool if in_memory else None,
+        )
+        if not in_memory and get_env_int("UEBA_SQLITE_WAL", 0):
+            event.listen(engine, "connect", _set_sqlite_pragmas)
+        return engine
+
+    options = {}
+    if url.get_backend_name() == "postgresql" and url.get_driver_name() == "psycopg2":
+        options["executemany_mode"] = "values_plus_batch"
     return create_engine(
-        database_url,
-        connect_args=connect_args,
+        url,
         future=True,
+        json_serializer=json_codec.dumps,
+        json_deserializer=json_codec.loads,
         pool_pre_ping=True,
+        insertmanyvalues_page_size=insert_page_size,
+        pool_size=get_env_int("UEBA_DB_POOL_SIZE", 10),
+        max_overflow=get_env_int("UEBA_DB_MAX_OVERFLOW", 20),
+        pool_recycle=get_env_int("UEBA_DB_POOL_RECYCLE_SECONDS", 1800),
+        pool_timeout=get_env_int("UEBA_DB_POOL_TIMEOUT_SECONDS", 30),
+        **options,
     )
 
 
@@ -31,11 +74,22 @@ def get_engine(database_url: Optional[str] = None):
     return _create_engine(url)
 
 
-def get_session_factory(database_url: Optional[str] = None):
+def get_session_factory(database_url: Optional[str] = None) -> sessionmaker:
+    # A plain sessionmaker: every call hands out an independent Session rather than one
+    # shared per thread, so concurrent workers never reuse each other's identity map.
     engine = get_engine(database_url)
-    return scoped_session(
-        sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
-    )
+    return sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
 
 
-SessionLocal = get_session_factory()
+@contextmanager
+def session_scope(database_url: Optional[str] = None) -> Iterator[Session]:
+    """Yield a fresh session that commits on success and rolls back on error."""
+    session = get_session_factory(database_url)()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
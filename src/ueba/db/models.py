@@ -13,6 +13,7 @@ from sqlalchemy import (
     Text,
     JSON,
     func,
+    text,
 )
 from sqlalchemy.orm import Mapped, mapped_column
 
@@ -21,6 +22,10 @@ from .base import Base
 
 TIMESTAMP = DateTime(timezone=True)
 
+# Partial index predicate shared by the latest-first lookups, which never read soft-deleted rows.
+ACTIVE_ROWS = text("deleted_at IS NULL")
+ANALYZER_ROWS = text("deleted_at IS NULL AND generator = 'analyzer_service'")
+
 
 class TimestampMixin:
     created_at: Mapped[datetime] = mapped_column(
@@ -97,6 +102,13 @@ class NormalizedEvent(TimestampMixin, SoftDeleteMixin, StatusMixin, Base):
 
     __table_args__ = (
         Index("ix_normalized_events_entity_observed", "entity_id", "observed_at"),
+        Index(
+            "ix_normalized_events_entity_observed_active",
+            "entity_id",
+            text("observed_at DESC"),
+            postgresql_where=ACTIVE_ROWS,
+            sqlite_where=ACTIVE_ROWS,
+        ),
     )
 
 
@@ -113,9 +125,32 @@ class EntityRiskHistory(TimestampMixin, SoftDeleteMixin, StatusMixin, Base):
     risk_score: Mapped[float] = mapped_column(Float, nullable=False)
     observed_at: Mapped[datetime] = mapped_column(TIMESTAMP, nullable=False)
     reason: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    generator: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
 
     __table_args__ = (
-        Index("ix_entity_risk_history_entity_observed", "entity_id", "observed_at"),
+        Index(
+            "ix_entity_risk_history_entity_observed_active",
+            "entity_id",
+            text("observed_at DESC"),
+            postgresql_where=ACTIVE_ROWS,
+            sqlite_where=ACTIVE_ROWS,
+        ),
+        # One analyzer row per entity/window; the target of the analyzer's bulk upsert.
+        Index(
+            "ux_entity_risk_history_analyzer_window",
+            "entity_id",
+            "observed_at",
+            unique=True,
+            postgresql_where=ANALYZER_ROWS,
+            sqlite_where=ANALYZER_ROWS,
+        ),
+        Index(
+            "ix_entity_risk_history_generator_observed_active",
+            "generator",
+            text("observed_at DESC"),
+            postgresql_where=ACTIVE_ROWS,
+            sqlite_where=ACTIVE_ROWS,
+        ),
     )
 
 
@@ -136,6 +171,16 @@ class TPFPFeedback(TimestampMixin, SoftDeleteMixin, StatusMixin, Base):
         TIMESTAMP, nullable=False, server_default=func.now()
     )
 
+    __table_args__ = (
+        Index(
+            "ix_tp_fp_feedback_entity_submitted_active",
+            "entity_id",
+            text("submitted_at DESC"),
+            postgresql_where=ACTIVE_ROWS,
+            sqlite_where=ACTIVE_ROWS,
+        ),
+    )
+
 
 class ThresholdOverride(TimestampMixin, SoftDeleteMixin, StatusMixin, Base):
     __tablename__ = "threshold_overrides"
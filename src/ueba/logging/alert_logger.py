@@ -1,11 +1,16 @@
 from __future__ import annotations
 
-import json
+import atexit
 import os
+import threading
+import time
+import weakref
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
+from ueba.utils import json_codec
+
 
 def _default_log_path() -> Path:
     return Path(os.getenv("UEBA_ALERT_LOG_PATH", "./ueba_alerts.log"))
@@ -15,12 +20,47 @@ def _utc_now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
+_OPEN_FLAGS = os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, "O_BINARY", 0)
+
+# Loggers with a live buffer; drained at interpreter exit so buffered alerts are not lost.
+_live_loggers: "weakref.WeakSet[AlertLogger]" = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_live_loggers() -> None:
+    for alert_logger in list(_live_loggers):
+        alert_logger.close()
+
+
 class AlertLogger:
-    """Structured alert logger writing newline-delimited JSON."""
+    """
+    Structured alert logger writing newline-delimited JSON.
+
+    By default every alert is written and flushed immediately. With ``flush_bytes`` > 0,
+    encoded alerts are buffered and written in one call once the buffer reaches that
+    size or ``flush_interval_s`` has passed since the last write; call ``flush()`` or
+    ``close()`` to drain the remainder. Pending alerts are also drained at interpreter exit.
+
+    The file is opened once with ``O_APPEND``, so each flush is a single append and
+    lines from concurrent writers never interleave mid-line.
+    """
 
-    def __init__(self, log_path: Optional[Path] = None):
+    def __init__(
+        self,
+        log_path: Optional[Path] = None,
+        *,
+        flush_bytes: int = 0,
+        flush_interval_s: float = 1.0,
+    ):
         self.log_path = log_path or _default_log_path()
         self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        self.flush_bytes = flush_bytes
+        self.flush_interval_s = flush_interval_s
+        self._fd: Optional[int] = None
+        self._buffer = bytearray()
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        _live_loggers.add(self)
 
     def log_anomaly(
         self,
@@ -41,7 +81,51 @@ class AlertLogger:
             "delta": delta,
             "triggered_rules": triggered_rules,
         }
+        line = json_codec.dumps_line(payload, sort_keys=True)
+
+        with self._lock:
+            self._buffer += line
+            if (
+                len(self._buffer) >= self.flush_bytes
+                or time.monotonic() - self._last_flush >= self.flush_interval_s
+            ):
+                self._write_buffer()
+
+    def flush(self) -> None:
+        """Write any buffered alerts to the log file."""
+        with self._lock:
+            self._write_buffer()
+
+    def close(self) -> None:
+        """Flush buffered alerts and close the log file; the next alert reopens it."""
+        with self._lock:
+            self._write_buffer()
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def _write_buffer(self) -> None:
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        if self._fd is None:
+            self._fd = os.open(self.log_path, _OPEN_FLAGS, 0o644)
+        written = os.write(self._fd, self._buffer)
+        while written < len(self._buffer):
+            # Short writes are rare for regular files but possible (e.g. a full disk).
+            with memoryview(self._buffer) as view:
+                written += os.write(self._fd, view[written:])
+        self._buffer.clear()
+
+    def __del__(self) -> None:
+        # A raw descriptor is not closed by garbage collection the way a file object is.
+        try:
+            self.close()
+        except Exception:  # pragma: no cover - best effort during interpreter teardown
+            pass
+
+    def __enter__(self) -> "AlertLogger":
+        return self
 
-        with self.log_path.open("a", encoding="utf-8") as handle:
-            handle.write(json.dumps(payload, sort_keys=True))
-            handle.write("\n")
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
@@ -1,4 +1,5 @@
 from .pipeline import (
+    AnalyzerEvent,
     AnalyzerPipeline,
     AnalyzerResult,
     ExtractedFeatures,
@@ -10,17 +11,19 @@ from .pipeline import (
     SimpleFeatureExtractor,
     SimpleScoring,
 )
-from .repository import AnalyzerRepository, EntityEventWindow
+from .repository import AnalyzerRepository, EntityEventWindow, EventRow
 from .service import AnalyzerService
 from .baseline import BaselineCalculator
 
 __all__ = [
+    "AnalyzerEvent",
     "AnalyzerPipeline",
     "AnalyzerRepository",
     "AnalyzerResult",
     "AnalyzerService",
     "BaselineCalculator",
     "EntityEventWindow",
+    "EventRow",
     "ExtractedFeatures",
     "FeatureExtractor",
     "PlaceholderRuleEvaluator",
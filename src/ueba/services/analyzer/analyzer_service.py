@@ -50,6 +50,11 @@ def main() -> None:
         default=300,
         help="Polling interval in seconds for daemon mode (default: 300)",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Processes used for window analysis (default: UEBA_ANALYZER_WORKERS or 1)",
+    )
     parser.add_argument(
         "--database-url",
         help="Database URL (default: from DATABASE_URL env or sqlite:///./ueba.db)",
@@ -71,7 +76,7 @@ def main() -> None:
 
         os.environ["DATABASE_URL"] = args.database_url
 
-    service = AnalyzerService()
+    service = AnalyzerService(workers=args.workers)
 
     if args.mode == "once":
         logger.info("Running analyzer in one-shot mode")
@@ -1,17 +1,36 @@
 from __future__ import annotations
 
+import math
 import os
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Dict, Tuple, Optional
+from typing import Dict, Iterable, Tuple, Optional
 
-from sqlalchemy import func, select
+from sqlalchemy import bindparam, func, select
 from sqlalchemy.orm import Session
 
 from ueba.db.models import EntityRiskHistory
+from ueba.utils.compat import DATACLASS_SLOTS
 
 
-@dataclass(frozen=True)
+_BASELINE_STMT = (
+    select(
+        EntityRiskHistory.entity_id,
+        func.avg(EntityRiskHistory.risk_score),
+        # avg(x^2) instead of stddev_pop so the query also runs on SQLite.
+        func.avg(EntityRiskHistory.risk_score * EntityRiskHistory.risk_score),
+    )
+    .where(
+        EntityRiskHistory.entity_id.in_(bindparam("entity_ids", expanding=True)),
+        EntityRiskHistory.deleted_at.is_(None),
+        EntityRiskHistory.observed_at >= bindparam("since"),
+        EntityRiskHistory.observed_at < bindparam("until"),
+    )
+    .group_by(EntityRiskHistory.entity_id)
+)
+
+
+@dataclass(frozen=True, **DATACLASS_SLOTS)
 class BaselineStats:
     avg: float
     sigma: float
@@ -26,28 +45,34 @@ class BaselineCalculator:
             sigma_multiplier = float(os.getenv("UEBA_SIGMA_MULTIPLIER", "3.0"))
         self.window_days = window_days
         self.sigma_multiplier = sigma_multiplier
-        self.cache: Dict[int, BaselineStats] = {}
+        self.cache: Dict[Tuple[int, datetime], BaselineStats] = {}
+
+    def prefetch(self, entity_ids: Iterable[int], until: datetime) -> None:
+        """Compute and cache baselines for many entities sharing ``until`` in one query."""
+        missing = {entity_id for entity_id in entity_ids if (entity_id, until) not in self.cache}
+        if not missing:
+            return
+
+        params = {
+            "entity_ids": sorted(missing),
+            "since": until - timedelta(days=self.window_days),
+            "until": until,
+        }
+        for entity_id, avg, avg_sq in self.session.execute(_BASELINE_STMT, params):
+            avg = float(avg or 0.0)
+            # Population variance; clamp tiny negative values from float rounding.
+            variance = max(float(avg_sq or 0.0) - avg * avg, 0.0)
+            self.cache[(entity_id, until)] = BaselineStats(avg=avg, sigma=math.sqrt(variance))
+
+        # Entities without history in the window get an empty baseline.
+        for entity_id in missing:
+            self.cache.setdefault((entity_id, until), BaselineStats(avg=0.0, sigma=0.0))
 
     def get_baseline(self, entity_id: int, until: datetime) -> BaselineStats:
-        if entity_id in self.cache:
-            return self.cache[entity_id]
-
-        query = (
-            select(func.avg(EntityRiskHistory.risk_score), func.stddev_pop(EntityRiskHistory.risk_score))
-            .where(
-                EntityRiskHistory.entity_id == entity_id,
-                EntityRiskHistory.deleted_at.is_(None),
-                EntityRiskHistory.observed_at >= until - timedelta(days=self.window_days),
-                EntityRiskHistory.observed_at < until,
-            )
-        )
-
-        result = self.session.execute(query).one()
-        avg = result[0] or 0.0
-        sigma = result[1] or 0.0
-        stats = BaselineStats(avg=avg, sigma=sigma)
-        self.cache[entity_id] = stats
-        return stats
+        key = (entity_id, until)
+        if key not in self.cache:
+            self.prefetch([entity_id], until)
+        return self.cache[key]
 
     def is_anomalous(self, entity_id: int, until: datetime, risk_score: float) -> Tuple[bool, float]:
         stats = self.get_baseline(entity_id, until)
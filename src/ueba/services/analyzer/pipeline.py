@@ -5,40 +5,32 @@ from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Any, Dict, List, Optional, Protocol, Sequence
 
-from ueba.db.models import NormalizedEvent
+from ueba.utils.compat import DATACLASS_SLOTS
 
-from .repository import ensure_utc
+from .repository import EventRow, ensure_utc, event_severity
 
 
-def _extract_severity_from_payload(payload: Optional[Dict[str, Any]]) -> Optional[int]:
-    if not isinstance(payload, dict):
-        return None
+class AnalyzerEvent(Protocol):
+    """
+    Event attributes the pipeline reads.
 
-    if "severity" in payload:
-        try:
-            return int(payload["severity"])
-        except (TypeError, ValueError):  # pragma: no cover - defensive guard
-            return None
+    Satisfied by both ``NormalizedEvent`` ORM instances and the repository's ``EventRow``.
+    """
 
-    data = payload.get("data")
-    if isinstance(data, dict) and "severity" in data:
-        try:
-            return int(data["severity"])
-        except (TypeError, ValueError):  # pragma: no cover - defensive guard
-            return None
+    event_type: str
+    observed_at: datetime
+    risk_score: Optional[float]
+    normalized_payload: Optional[Dict[str, Any]]
+    original_payload: Optional[Dict[str, Any]]
 
-    return None
 
+def _severity_from_event(event: AnalyzerEvent) -> Optional[int]:
+    if isinstance(event, EventRow):
+        return event.severity
+    return event_severity(event.normalized_payload, event.original_payload, event.risk_score)
 
-def _severity_from_event(event: NormalizedEvent) -> Optional[int]:
-    return (
-        _extract_severity_from_payload(event.normalized_payload)
-        or _extract_severity_from_payload(event.original_payload)
-        or (int(event.risk_score) if event.risk_score is not None else None)
-    )
 
-
-@dataclass(frozen=True)
+@dataclass(frozen=True, **DATACLASS_SLOTS)
 class ExtractedFeatures:
     """Simple feature set for Phase 0."""
 
@@ -48,7 +40,7 @@ class ExtractedFeatures:
     event_types: List[str] = field(default_factory=list)
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, **DATACLASS_SLOTS)
 class RuleEvaluation:
     """Output of rule evaluation stage."""
 
@@ -56,7 +48,7 @@ class RuleEvaluation:
     metadata: Dict[str, Any] = field(default_factory=dict)
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, **DATACLASS_SLOTS)
 class AnalyzerResult:
     """Final output of the analyzer pipeline."""
 
@@ -84,7 +76,7 @@ class FeatureExtractor(ABC):
     """Base class for feature extraction stages."""
 
     @abstractmethod
-    def extract(self, events: Sequence[NormalizedEvent]) -> ExtractedFeatures:
+    def extract(self, events: Sequence[AnalyzerEvent]) -> ExtractedFeatures:
         """Extract features from a sequence of events."""
         pass
 
@@ -92,24 +84,31 @@ class FeatureExtractor(ABC):
 class SimpleFeatureExtractor(FeatureExtractor):
     """Basic feature extractor for Phase 0."""
 
-    def extract(self, events: Sequence[NormalizedEvent]) -> ExtractedFeatures:
+    def extract(self, events: Sequence[AnalyzerEvent]) -> ExtractedFeatures:
         """Extract simple aggregates: count, max severity, last observed, event types."""
         if not events:
             raise ValueError("Cannot extract features from empty event list")
 
-        event_count = len(events)
-        severities = [_severity_from_event(e) for e in events]
-        severities = [s for s in severities if s is not None]
-        highest_severity = int(max(severities)) if severities else None
+        # Single pass: ORM attribute access is the dominant cost on large windows.
+        highest_severity: Optional[int] = None
+        last_observed: Optional[datetime] = None
+        event_types = set()
+        for event in events:
+            severity = _severity_from_event(event)
+            if severity is not None and (highest_severity is None or severity > highest_severity):
+                highest_severity = severity
+
+            observed_at = event.observed_at
+            if last_observed is None or observed_at > last_observed:
+                last_observed = observed_at
 
-        last_observed = max(e.observed_at for e in events)
-        event_types = sorted({e.event_type for e in events})
+            event_types.add(event.event_type)
 
         return ExtractedFeatures(
-            event_count=event_count,
+            event_count=len(events),
             highest_severity=highest_severity,
             last_observed_at=ensure_utc(last_observed),
-            event_types=event_types,
+            event_types=sorted(event_types),
         )
 
 
@@ -118,7 +117,7 @@ class RuleEvaluator(ABC):
 
     @abstractmethod
     def evaluate(
-        self, entity_id: int, features: ExtractedFeatures, events: Sequence[NormalizedEvent]
+        self, entity_id: int, features: ExtractedFeatures, events: Sequence[AnalyzerEvent]
     ) -> RuleEvaluation:
         """Evaluate rules based on features and events."""
         pass
@@ -128,7 +127,7 @@ class PlaceholderRuleEvaluator(RuleEvaluator):
     """Placeholder rule evaluator for Phase 0."""
 
     def evaluate(
-        self, entity_id: int, features: ExtractedFeatures, events: Sequence[NormalizedEvent]
+        self, entity_id: int, features: ExtractedFeatures, events: Sequence[AnalyzerEvent]
     ) -> RuleEvaluation:
         """Simple threshold-based rules as placeholder."""
         triggered = []
@@ -168,20 +167,16 @@ class SimpleScoring(ScoringStrategy):
         - Severity bonus (0-30 points)
         - Rule trigger bonus (30 points per rule)
         """
-        score = 0.0
-
-        # Event count contribution (cap at 40)
-        score += min(features.event_count * 2, 40)
-
-        # Severity contribution (0-30 based on highest severity)
-        if features.highest_severity is not None:
-            score += (features.highest_severity / 10.0) * 30
-
-        # Rule trigger bonus
-        score += len(rule_evaluation.triggered_rules) * 30
-
-        # Cap at 100
-        return min(score, 100.0)
+        # One integer expression: a missing severity counts as 0, and severity * 3 equals
+        # severity / 10 * 30. The result only becomes a float at the return.
+        return float(
+            min(
+                100,
+                min(40, features.event_count * 2)
+                + (features.highest_severity or 0) * 3
+                + len(rule_evaluation.triggered_rules) * 30,
+            )
+        )
 
 
 class AnalyzerPipeline:
@@ -202,7 +197,7 @@ class AnalyzerPipeline:
         entity_id: int,
         window_start: datetime,
         window_end: datetime,
-        events: Sequence[NormalizedEvent],
+        events: Sequence[AnalyzerEvent],
     ) -> AnalyzerResult:
         """
         Run the full analyzer pipeline for a given entity/window.
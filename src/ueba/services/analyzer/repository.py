@@ -1,14 +1,16 @@
 from __future__ import annotations
 
-import json
 from dataclasses import dataclass
+from itertools import groupby
 from datetime import datetime, timedelta, timezone
-from typing import Dict, List, Optional, Sequence, Tuple, TYPE_CHECKING
+from typing import Iterator, List, Optional, Sequence, Tuple, TYPE_CHECKING
 
-from sqlalchemy import func, select
+from sqlalchemy import bindparam, func, select
 from sqlalchemy.orm import Session
 
 from ueba.db.models import EntityRiskHistory, NormalizedEvent
+from ueba.utils import json_codec
+from ueba.utils.compat import DATACLASS_SLOTS
 
 if TYPE_CHECKING:  # pragma: no cover
     from .pipeline import AnalyzerResult
@@ -28,12 +30,95 @@ def window_bounds(observed_at: datetime) -> Tuple[datetime, datetime]:
     return start, start + timedelta(days=1)
 
 
-@dataclass(frozen=True)
+def _utc_day_ordinal(observed_at: datetime) -> int:
+    # Naive timestamps are stored as UTC, so only aware values need converting.
+    if observed_at.tzinfo is not None:
+        observed_at = observed_at.astimezone(UTC)
+    return observed_at.toordinal()
+
+
+def _extract_severity_from_payload(payload: Optional[dict]) -> Optional[int]:
+    if payload is None:
+        return None
+
+    # Non-dict payloads fail the membership test or .get() and land in the except, which
+    # saves an isinstance check per level on the common path. A present key wins even when
+    # its value is null or malformed; only a missing key falls back to data.severity.
+    try:
+        if "severity" in payload:
+            return int(payload["severity"])
+        data = payload.get("data")
+        if data is not None and "severity" in data:
+            return int(data["severity"])
+    except (AttributeError, TypeError, ValueError):
+        return None
+    return None
+
+
+def event_severity(
+    normalized_payload: Optional[dict],
+    original_payload: Optional[dict],
+    risk_score: Optional[float],
+) -> Optional[int]:
+    return (
+        _extract_severity_from_payload(normalized_payload)
+        or _extract_severity_from_payload(original_payload)
+        or (int(risk_score) if risk_score is not None else None)
+    )
+
+
+# Events the analyzer considers: attributed to an entity, active and not soft-deleted.
+_ANALYZABLE_EVENTS = (
+    NormalizedEvent.entity_id.is_not(None),
+    NormalizedEvent.deleted_at.is_(None),
+    NormalizedEvent.status == "active",
+)
+
+# Statements reused on every call; only their bound parameters change.
+_LATEST_HISTORY_STMT = (
+    select(EntityRiskHistory)
+    .where(
+        EntityRiskHistory.entity_id == bindparam("entity_id"),
+        EntityRiskHistory.deleted_at.is_(None),
+    )
+    .order_by(EntityRiskHistory.observed_at.desc())
+    .limit(1)
+)
+
+_FIND_HISTORY_STMT = select(EntityRiskHistory).where(
+    EntityRiskHistory.entity_id == bindparam("entity_id"),
+    EntityRiskHistory.observed_at == bindparam("observed_at"),
+    EntityRiskHistory.deleted_at.is_(None),
+    EntityRiskHistory.generator == bindparam("generator"),
+)
+
+_CHECKPOINT_STMT = select(func.max(EntityRiskHistory.observed_at)).where(
+    EntityRiskHistory.generator == bindparam("generator"),
+    EntityRiskHistory.deleted_at.is_(None),
+)
+
+
+@dataclass(frozen=True, **DATACLASS_SLOTS)
+class EventRow:
+    """Lightweight read-only view of the NormalizedEvent columns the analyzer uses."""
+
+    id: int
+    entity_id: int
+    event_type: str
+    observed_at: datetime
+    risk_score: Optional[float]
+    normalized_payload: Optional[dict]
+    original_payload: Optional[dict]
+    # Resolved once at load time so pipeline stages don't re-walk the payloads.
+    severity: Optional[int] = None
+
+
+@dataclass(frozen=True, **DATACLASS_SLOTS)
 class EntityEventWindow:
     entity_id: int
     window_start: datetime
     window_end: datetime
-    events: Sequence[NormalizedEvent]
+    events: Sequence[EventRow]
 
 
 class AnalyzerRepository:
@@ -41,6 +126,8 @@ class AnalyzerRepository:
 
     REASON_GENERATOR = "analyzer_service"
     REASON_KIND = "daily_rollup"
+    UPSERT_BATCH_SIZE = 500
+    FETCH_BATCH_SIZE = 5000
 
     def __init__(self, session: Session):
         self.session = session
@@ -48,16 +135,42 @@ class AnalyzerRepository:
     # ------------------------------------------------------------------
     # Normalized event queries
     # ------------------------------------------------------------------
+    def earliest_event_time(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> Optional[datetime]:
+        stmt = select(func.min(NormalizedEvent.observed_at)).where(*_ANALYZABLE_EVENTS)
+        if since is not None:
+            stmt = stmt.where(NormalizedEvent.observed_at >= ensure_utc(since))
+        if until is not None:
+            stmt = stmt.where(NormalizedEvent.observed_at < ensure_utc(until))
+        earliest = self.session.execute(stmt).scalar_one_or_none()
+        return ensure_utc(earliest) if earliest is not None else None
+
     def fetch_entity_event_windows(
         self,
         since: Optional[datetime] = None,
         until: Optional[datetime] = None,
     ) -> List[EntityEventWindow]:
-        stmt = select(NormalizedEvent).where(
-            NormalizedEvent.entity_id.is_not(None),
-            NormalizedEvent.deleted_at.is_(None),
-            NormalizedEvent.status == "active",
-        )
+        return list(self.iter_entity_event_windows(since=since, until=until))
+
+    def iter_entity_event_windows(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> Iterator[EntityEventWindow]:
+        """Yield windows as the ordered event stream produces them; only one is held at a time."""
+        # Plain column rows skip ORM hydration and identity-map bookkeeping for every event.
+        stmt = select(
+            NormalizedEvent.id,
+            NormalizedEvent.entity_id,
+            NormalizedEvent.event_type,
+            NormalizedEvent.observed_at,
+            NormalizedEvent.risk_score,
+            NormalizedEvent.normalized_payload,
+            NormalizedEvent.original_payload,
+        ).where(*_ANALYZABLE_EVENTS)
 
         if since is not None:
             stmt = stmt.where(NormalizedEvent.observed_at >= ensure_utc(since))
@@ -66,38 +179,50 @@ class AnalyzerRepository:
 
         stmt = stmt.order_by(NormalizedEvent.entity_id, NormalizedEvent.observed_at)
 
-        events: Sequence[NormalizedEvent] = self.session.execute(stmt).scalars().all()
-        grouped: Dict[Tuple[int, datetime], List[NormalizedEvent]] = {}
-
-        for event in events:
-            if event.entity_id is None:
-                continue
-            start, _ = window_bounds(event.observed_at)
-            key = (event.entity_id, start)
-            grouped.setdefault(key, [])
-            grouped[key].append(event)
-
-        windows = [
-            EntityEventWindow(
-                entity_id=entity_id,
-                window_start=window_start,
-                window_end=window_start + timedelta(days=1),
-                events=grouped[(entity_id, window_start)],
+        # Server-side cursor where the driver supports one, so rows arrive in
+        # FETCH_BATCH_SIZE chunks instead of being buffered up front.
+        rows = self.session.execute(
+            stmt.execution_options(stream_results=True, yield_per=self.FETCH_BATCH_SIZE)
+        )
+        events = (
+            EventRow(
+                *row,
+                severity=event_severity(row.normalized_payload, row.original_payload, row.risk_score),
             )
-            for (entity_id, window_start) in sorted(grouped.keys(), key=lambda item: (item[0], item[1]))
-        ]
+            for row in rows
+        )
 
-        return windows
+        # Rows arrive ordered by (entity_id, observed_at), so each entity/day window is a
+        # contiguous run and windows come out already sorted. Grouping on the integer day
+        # ordinal builds the window datetimes once per group rather than once per event.
+        try:
+            for (entity_id, day), window_events in groupby(
+                events, key=lambda event: (event.entity_id, _utc_day_ordinal(event.observed_at))
+            ):
+                window_start = datetime.fromordinal(day).replace(tzinfo=UTC)
+                yield EntityEventWindow(
+                    entity_id=entity_id,
+                    window_start=window_start,
+                    window_end=window_start + timedelta(days=1),
+                    events=list(window_events),
+                )
+        finally:
+            # Release the cursor even if the caller stops iterating early.
+            rows.close()
 
     # ------------------------------------------------------------------
     # Entity risk history helpers
     # ------------------------------------------------------------------
-    def persist_result(self, result: "AnalyzerResult") -> EntityRiskHistory:
+    def _reason_json(
+        self, result: "AnalyzerResult", window_iso: Optional[Tuple[str, str]] = None
+    ) -> str:
+        if window_iso is None:
+            window_iso = (result.window_start.isoformat(), result.window_end.isoformat())
         payload = {
             "generator": self.REASON_GENERATOR,
             "kind": self.REASON_KIND,
-            "window_start": result.window_start.isoformat(),
-            "window_end": result.window_end.isoformat(),
+            "window_start": window_iso[0],
+            "window_end": window_iso[1],
             "event_count": result.features.event_count,
             "highest_severity": result.features.highest_severity,
             "last_observed_at": result.features.last_observed_at.isoformat(),
@@ -112,10 +237,15 @@ class AnalyzerRepository:
                 "is_anomalous": result.is_anomalous,
             },
         }
-        reason = json.dumps(payload, sort_keys=True)
+        return json_codec.dumps(payload, sort_keys=True)
+
+    def persist_result(self, result: "AnalyzerResult") -> EntityRiskHistory:
+        reason = self._reason_json(result)
 
         existing = self._find_history(result.entity_id, result.window_end)
         if existing:
+            # Reassigning equal values leaves the attribute history empty, so the flush
+            # emits no UPDATE for a replayed window.
             existing.risk_score = result.risk_score
             existing.reason = reason
             return existing
@@ -126,37 +256,89 @@ class AnalyzerRepository:
             risk_score=result.risk_score,
             observed_at=result.window_end,
             reason=reason,
+            generator=self.REASON_GENERATOR,
         )
         self.session.add(history)
         return history
 
-    def latest_history_for_entity(self, entity_id: int) -> Optional[EntityRiskHistory]:
-        stmt = (
-            select(EntityRiskHistory)
-            .where(
-                EntityRiskHistory.entity_id == entity_id,
-                EntityRiskHistory.deleted_at.is_(None),
+    def persist_results(self, results: Sequence["AnalyzerResult"]) -> None:
+        """
+        Upsert many results with batched INSERT ... ON CONFLICT statements.
+
+        Conflicts are resolved against the partial unique index on analyzer rows, so a
+        re-run of a window updates its score and reason in place; rows whose score and
+        reason are unchanged are left untouched. Dialects without
+        ON CONFLICT support fall back to ``persist_result`` per row.
+        """
+        if not results:
+            return
+
+        dialect = self.session.get_bind().dialect.name
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        elif dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        else:
+            for result in results:
+                self.persist_result(result)
+            return
+
+        # Results in a batch share a handful of windows (usually one UTC day), so format
+        # each window's bounds once instead of once per entity.
+        window_iso: dict = {}
+        rows = []
+        for result in results:
+            key = (result.window_start, result.window_end)
+            bounds = window_iso.get(key)
+            if bounds is None:
+                bounds = window_iso[key] = (key[0].isoformat(), key[1].isoformat())
+            rows.append(
+                {
+                    "entity_id": result.entity_id,
+                    "risk_score": result.risk_score,
+                    "observed_at": ensure_utc(result.window_end),
+                    "reason": self._reason_json(result, bounds),
+                    "generator": self.REASON_GENERATOR,
+                }
             )
-            .order_by(EntityRiskHistory.observed_at.desc())
-            .limit(1)
-        )
-        return self.session.execute(stmt).scalar_one_or_none()
+        for start in range(0, len(rows), self.UPSERT_BATCH_SIZE):
+            stmt = upsert(EntityRiskHistory).values(rows[start : start + self.UPSERT_BATCH_SIZE])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[EntityRiskHistory.entity_id, EntityRiskHistory.observed_at],
+                index_where=(
+                    EntityRiskHistory.deleted_at.is_(None)
+                    & (EntityRiskHistory.generator == self.REASON_GENERATOR)
+                ),
+                set_={
+                    "risk_score": stmt.excluded.risk_score,
+                    "reason": stmt.excluded.reason,
+                    "updated_at": func.now(),
+                },
+                where=(
+                    EntityRiskHistory.risk_score.is_distinct_from(stmt.excluded.risk_score)
+                    | EntityRiskHistory.reason.is_distinct_from(stmt.excluded.reason)
+                ),
+            )
+            self.session.execute(stmt)
+
+    def latest_history_for_entity(self, entity_id: int) -> Optional[EntityRiskHistory]:
+        return self.session.execute(
+            _LATEST_HISTORY_STMT, {"entity_id": entity_id}
+        ).scalar_one_or_none()
 
     def _find_history(self, entity_id: int, observed_at: datetime) -> Optional[EntityRiskHistory]:
-        stmt = select(EntityRiskHistory).where(
-            EntityRiskHistory.entity_id == entity_id,
-            EntityRiskHistory.observed_at == ensure_utc(observed_at),
-            EntityRiskHistory.deleted_at.is_(None),
-        )
-        return self.session.execute(stmt).scalar_one_or_none()
+        params = {
+            "entity_id": entity_id,
+            "observed_at": ensure_utc(observed_at),
+            "generator": self.REASON_GENERATOR,
+        }
+        return self.session.execute(_FIND_HISTORY_STMT, params).scalar_one_or_none()
 
     # ------------------------------------------------------------------
     # Checkpoint helpers
     # ------------------------------------------------------------------
     def get_latest_checkpoint(self) -> Optional[datetime]:
-        stmt = select(func.max(EntityRiskHistory.observed_at)).where(
-            EntityRiskHistory.reason.is_not(None),
-            EntityRiskHistory.reason.contains(f'"generator": "{self.REASON_GENERATOR}"'),
-        )
-        checkpoint = self.session.execute(stmt).scalar_one_or_none()
+        checkpoint = self.session.execute(
+            _CHECKPOINT_STMT, {"generator": self.REASON_GENERATOR}
+        ).scalar_one_or_none()
         return ensure_utc(checkpoint) if checkpoint is not None else None
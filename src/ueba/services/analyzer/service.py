@@ -1,20 +1,43 @@
 from __future__ import annotations
 
 import logging
-import time
-from datetime import datetime, timezone
-from typing import Optional
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
 
 from ueba.db.base import get_session_factory
 from ueba.logging import AlertLogger
+from ueba.utils import get_env_int
 
-from .pipeline import AnalyzerPipeline
-from .repository import AnalyzerRepository
+from .pipeline import AnalyzerPipeline, AnalyzerResult
+from .repository import AnalyzerRepository, EntityEventWindow, window_bounds
 from .baseline import BaselineCalculator
 
 logger = logging.getLogger(__name__)
 
 
+# Pipeline used by process-pool workers; installed once per worker by the pool initializer.
+_worker_pipeline: Optional[AnalyzerPipeline] = None
+
+
+def _init_worker(pipeline: AnalyzerPipeline) -> None:
+    global _worker_pipeline
+    _worker_pipeline = pipeline
+
+
+def _analyze_window(window: EntityEventWindow) -> AnalyzerResult:
+    if _worker_pipeline is None:
+        raise RuntimeError("Analyzer worker was started without _init_worker installing a pipeline")
+    return _worker_pipeline.analyze(
+        entity_id=window.entity_id,
+        window_start=window.window_start,
+        window_end=window.window_end,
+        events=window.events,
+    )
+
+
 def default_until() -> datetime:
     """Default end time is start of current UTC day (exclusive)."""
     now = datetime.now(timezone.utc)
@@ -22,17 +45,35 @@ def default_until() -> datetime:
 
 
 class AnalyzerService:
-    """Service that processes normalized events into entity risk history."""
+    """
+    Service that processes normalized events into entity risk history.
+
+    Memory use is bounded independently of the analyzed range: events stream from a
+    server-side cursor ``AnalyzerRepository.FETCH_BATCH_SIZE`` rows at a time, and at
+    most ``WINDOW_BATCH_SIZE`` windows (with their events) are held per batch, within
+    a transaction spanning ``COMMIT_SLICE_DAYS`` days.
+    """
+
+    WINDOW_BATCH_SIZE = 500
+    # Days of events analyzed per transaction.
+    COMMIT_SLICE_DAYS = 1
 
     def __init__(
         self,
         session_factory=None,
         pipeline: Optional[AnalyzerPipeline] = None,
         alert_logger: Optional[AlertLogger] = None,
+        workers: Optional[int] = None,
     ):
         self.session_factory = session_factory or get_session_factory()
         self.pipeline = pipeline or AnalyzerPipeline()
-        self.alert_logger = alert_logger or AlertLogger()
+        # Alerts are buffered during a run and flushed once it finishes.
+        self.alert_logger = alert_logger or AlertLogger(flush_bytes=64 * 1024)
+        # With more than one worker, pipeline analysis runs in a process pool; the
+        # pipeline must then be picklable. Database work stays in this process.
+        if workers is None:
+            workers = get_env_int("UEBA_ANALYZER_WORKERS", 1)
+        self.workers = max(workers, 1)
 
     def run_once(
         self,
@@ -40,10 +81,16 @@ class AnalyzerService:
         until: Optional[datetime] = None,
     ) -> int:
         """Process events once and return number of processed windows."""
+        try:
+            return self._run_once(since=since, until=until)
+        finally:
+            self.alert_logger.flush()
+
+    def _run_once(self, since: Optional[datetime], until: Optional[datetime]) -> int:
         processed = 0
         until = until or default_until()
 
-        with self.session_factory() as session:
+        with self.session_factory() as session, self._executor() as executor:
             repository = AnalyzerRepository(session)
             baseline = BaselineCalculator(session)
 
@@ -57,75 +104,159 @@ class AnalyzerService:
                 )
                 return 0
 
-            windows = repository.fetch_entity_event_windows(since=checkpoint, until=until)
-            if not windows:
+            start = checkpoint or repository.earliest_event_time(until=until)
+            if start is None:
+                logger.info("Analyzer found no windows to process")
+                return 0
+
+            # Work through the range in whole UTC-day slices and commit after each one. A
+            # slice's event cursor is fully drained before its commit, and the checkpoint only
+            # ever advances past complete days, so an interrupted run resumes cleanly.
+            slice_start = start
+            while slice_start < until:
+                slice_end = min(
+                    window_bounds(slice_start)[0] + timedelta(days=self.COMMIT_SLICE_DAYS), until
+                )
+
+                # Windows stream from the event cursor and are analyzed in bounded batches,
+                # so memory is held to one batch rather than the whole range.
+                slice_processed = 0
+                batch: List[EntityEventWindow] = []
+                for window in repository.iter_entity_event_windows(since=slice_start, until=slice_end):
+                    batch.append(window)
+                    if len(batch) >= self.WINDOW_BATCH_SIZE:
+                        slice_processed += self._process_windows(batch, repository, baseline, executor)
+                        batch = []
+                slice_processed += self._process_windows(batch, repository, baseline, executor)
+
+                if slice_processed:
+                    session.commit()
+                    processed += slice_processed
+                    slice_start = slice_end
+                else:
+                    # Skip straight to the next day that has events, so a long idle gap
+                    # costs one lookup instead of a query per empty day.
+                    slice_start = repository.earliest_event_time(since=slice_end, until=until)
+                    if slice_start is None:
+                        break
+
+            if not processed:
                 logger.info("Analyzer found no windows to process")
                 return 0
 
-            for window in windows:
-                result = self.pipeline.analyze(
+        logger.info("Analyzer processed %s window(s)", processed)
+        return processed
+
+    def _executor(self):
+        if self.workers <= 1:
+            return nullcontext(None)
+        return ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_init_worker, initargs=(self.pipeline,)
+        )
+
+    def _analyze_windows(
+        self, windows: List[EntityEventWindow], executor: Optional[Executor]
+    ) -> List[AnalyzerResult]:
+        if executor is None:
+            return [
+                self.pipeline.analyze(
                     entity_id=window.entity_id,
                     window_start=window.window_start,
                     window_end=window.window_end,
                     events=window.events,
                 )
+                for window in windows
+            ]
+        # Hand each worker a few large chunks so pickling overhead stays per chunk.
+        chunksize = max(1, len(windows) // (self.workers * 4))
+        return list(executor.map(_analyze_window, windows, chunksize=chunksize))
 
-                baseline_stats = baseline.get_baseline(window.entity_id, window.window_end)
-                is_anomalous, delta = baseline.is_anomalous(
-                    window.entity_id,
-                    window.window_end,
-                    result.risk_score,
-                )
+    def _process_windows(
+        self,
+        windows: List[EntityEventWindow],
+        repository: AnalyzerRepository,
+        baseline: BaselineCalculator,
+        executor: Optional[Executor] = None,
+    ) -> int:
+        if not windows:
+            return 0
 
-                result = result.__class__(
-                    entity_id=result.entity_id,
-                    window_start=result.window_start,
-                    window_end=result.window_end,
-                    features=result.features,
-                    rule_evaluation=result.rule_evaluation,
-                    risk_score=result.risk_score,
-                    baseline_avg=baseline_stats.avg,
-                    baseline_sigma=baseline_stats.sigma,
-                    delta=delta,
-                    is_anomalous=is_anomalous,
-                )
+        # One baseline query per distinct window end instead of one per window.
+        entity_ids_by_until: Dict[datetime, List[int]] = {}
+        for window in windows:
+            entity_ids_by_until.setdefault(window.window_end, []).append(window.entity_id)
+        for window_end, entity_ids in entity_ids_by_until.items():
+            baseline.prefetch(entity_ids, window_end)
 
-                repository.persist_result(result)
+        results = []
+        for window, result in zip(windows, self._analyze_windows(windows, executor)):
+            baseline_stats = baseline.get_baseline(window.entity_id, window.window_end)
+            is_anomalous, delta = baseline.is_anomalous(
+                window.entity_id,
+                window.window_end,
+                result.risk_score,
+            )
 
-                if is_anomalous:
-                    self.alert_logger.log_anomaly(
-                        entity_id=result.entity_id,
-                        risk_score=result.risk_score,
-                        baseline_avg=result.baseline_avg or 0.0,
-                        baseline_sigma=result.baseline_sigma or 0.0,
-                        delta=result.delta or 0.0,
-                        triggered_rules=result.rule_evaluation.triggered_rules,
-                    )
+            result = result.__class__(
+                entity_id=result.entity_id,
+                window_start=result.window_start,
+                window_end=result.window_end,
+                features=result.features,
+                rule_evaluation=result.rule_evaluation,
+                risk_score=result.risk_score,
+                baseline_avg=baseline_stats.avg,
+                baseline_sigma=baseline_stats.sigma,
+                delta=delta,
+                is_anomalous=is_anomalous,
+            )
 
-                processed += 1
+            results.append(result)
 
-            session.commit()
+            if is_anomalous:
+                self.alert_logger.log_anomaly(
+                    entity_id=result.entity_id,
+                    risk_score=result.risk_score,
+                    baseline_avg=result.baseline_avg or 0.0,
+                    baseline_sigma=result.baseline_sigma or 0.0,
+                    delta=result.delta or 0.0,
+                    triggered_rules=result.rule_evaluation.triggered_rules,
+                )
 
-        logger.info("Analyzer processed %s window(s)", processed)
-        return processed
+        repository.persist_results(results)
+        return len(results)
 
     def run_forever(
         self,
         interval_seconds: int = 300,
         since: Optional[datetime] = None,
         until: Optional[datetime] = None,
+        trigger: Optional[threading.Event] = None,
     ) -> None:
-        """Continuously run the analyzer service at fixed intervals."""
+        """
+        Continuously run the analyzer service.
+
+        Runs happen every ``interval_seconds`` at most, as soon as ``trigger`` is set (e.g.
+        by an in-process producer after it commits new events), and, when ``until``
+        follows the current day, right after each UTC midnight, when the previous day's
+        windows become complete.
+        """
         logger.info(
             "Starting analyzer loop (interval=%ss, since=%s, until=%s)",
             interval_seconds,
             since,
             until,
         )
+        trigger = trigger or threading.Event()
         try:
             while True:
                 self.run_once(since=since, until=until)
                 since = None  # ensure subsequent runs rely on checkpoint
-                time.sleep(interval_seconds)
+                timeout = float(interval_seconds)
+                if until is None:
+                    next_day = default_until() + timedelta(days=1)
+                    seconds_to_next_day = (next_day - datetime.now(timezone.utc)).total_seconds()
+                    timeout = min(timeout, max(seconds_to_next_day, 0.0))
+                trigger.wait(timeout)
+                trigger.clear()
         except KeyboardInterrupt:
             logger.info("Analyzer loop interrupted - shutting down")
@@ -1,10 +1,16 @@
 from __future__ import annotations
 
-import json
 import sys
 import time
 from pathlib import Path
-from typing import Dict, Iterator, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from ueba.utils import json_codec
+
+try:  # pragma: no cover - optional, Linux-only
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:  # pragma: no cover
+    INotify = None
 
 
 class AlertInputSource:
@@ -12,16 +18,45 @@ class AlertInputSource:
         raise NotImplementedError
 
 
+# Inputs are read in raw chunks and parsed straight from bytes, skipping per-line decoding.
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def _parse_line(line: bytes) -> Optional[Dict]:
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        return json_codec.loads(line)
+    except ValueError:  # JSONDecodeError, or invalid UTF-8 under the stdlib parser
+        return None
+
+
+def _split_lines(buffer: bytes, chunk: bytes) -> Tuple[List[bytes], bytes]:
+    lines = (buffer + chunk).split(b"\n")
+    # The last element is an incomplete line until its newline arrives.
+    return lines, lines.pop()
+
+
 class StdInSource(AlertInputSource):
     def __iter__(self) -> Iterator[Dict]:
-        for line in sys.stdin:
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                yield json.loads(line)
-            except json.JSONDecodeError:
-                continue
+        stream = sys.stdin.buffer
+        buffer = b""
+        while True:
+            # read1 returns whatever is available, so a slow pipe is not held up waiting
+            # for a full chunk.
+            chunk = stream.read1(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            lines, buffer = _split_lines(buffer, chunk)
+            for line in lines:
+                alert = _parse_line(line)
+                if alert is not None:
+                    yield alert
+
+        alert = _parse_line(buffer)
+        if alert is not None:
+            yield alert
 
 
 class FileTailSource(AlertInputSource):
@@ -30,22 +65,51 @@ class FileTailSource(AlertInputSource):
         self.follow = follow
         self.poll_interval = poll_interval
 
+    def _open_watcher(self) -> Optional["INotify"]:
+        if not self.follow or INotify is None:
+            return None
+        try:
+            watcher = INotify()
+            watcher.add_watch(str(self.path), inotify_flags.MODIFY)
+        except OSError:  # pragma: no cover - e.g. inotify watch limit reached
+            return None
+        return watcher
+
+    def _wait_for_data(self, watcher: Optional["INotify"]) -> None:
+        if watcher is None:
+            time.sleep(self.poll_interval)
+            return
+        # Sleeps in the kernel until the file is written; poll_interval only bounds the wait.
+        watcher.read(timeout=int(self.poll_interval * 1000))
+
     def __iter__(self) -> Iterator[Dict]:
-        with self.path.open("r", encoding="utf-8") as f:
+        watcher = self._open_watcher()
+        try:
+            yield from self._read(watcher)
+        finally:
+            if watcher is not None:
+                watcher.close()
+
+    def _read(self, watcher: Optional["INotify"]) -> Iterator[Dict]:
+        with self.path.open("rb") as f:
+            buffer = b""
             while True:
-                line = f.readline()
-                if not line:
+                chunk = f.read(READ_CHUNK_SIZE)
+                if not chunk:
                     if not self.follow:
                         break
-                    time.sleep(self.poll_interval)
-                    continue
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    yield json.loads(line)
-                except json.JSONDecodeError:
+                    self._wait_for_data(watcher)
                     continue
+                lines, buffer = _split_lines(buffer, chunk)
+                for line in lines:
+                    alert = _parse_line(line)
+                    if alert is not None:
+                        yield alert
+
+            # The final line may not be newline-terminated.
+            alert = _parse_line(buffer)
+            if alert is not None:
+                yield alert
 
 
 class MessageQueueStubSource(AlertInputSource):
@@ -53,11 +117,14 @@ class MessageQueueStubSource(AlertInputSource):
         self.messages = messages or []
 
     def __iter__(self) -> Iterator[Dict]:
+        # Messages keep their original order; dedupe and entity merges depend on it.
+        loads = json_codec.loads
         for msg in self.messages:
             if isinstance(msg, dict):
                 yield msg
-            else:
-                try:
-                    yield json.loads(msg)
-                except json.JSONDecodeError:
-                    continue
+                continue
+            try:
+                alert = loads(msg)
+            except (ValueError, TypeError):  # malformed JSON, or an entry that is not a string
+                continue
+            yield alert
@@ -66,6 +66,7 @@ class AlertMapper:
         source: str = "wazuh",
         vendor: Optional[str] = None,
         product: Optional[str] = None,
+        dedupe_hash: Optional[str] = None,
     ) -> MappedAlert:
         start_time = time.time()
         metrics = MappingMetrics()
@@ -118,7 +119,8 @@ class AlertMapper:
                 attributes=enrichment_context,
             )
 
-        dedupe_hash = compute_alert_hash(alert)
+        if dedupe_hash is None:
+            dedupe_hash = compute_alert_hash(alert)
 
         raw_alert_payload = RawAlertPayload(
             dedupe_hash=dedupe_hash,
@@ -169,32 +171,35 @@ class AlertMapper:
     ) -> Dict[str, Any]:
         mapped = self.map_alert(alert, source=source)
         logger.debug(
-            f"Mapped alert in {mapped.metrics.mapping_latency_ms:.2f}ms - "
-            f"unmapped fields: {len(mapped.metrics.unmapped_fields)}"
+            "Mapped alert in %.2fms - unmapped fields: %d",
+            mapped.metrics.mapping_latency_ms,
+            len(mapped.metrics.unmapped_fields),
         )
 
         entity = None
         if mapped.entity_payload:
             entity = persistence.upsert_entity(mapped.entity_payload)
-            logger.debug(f"Upserted entity: {entity.entity_type}/{entity.entity_value} (id={entity.id})")
+            logger.debug(
+                "Upserted entity: %s/%s (id=%s)", entity.entity_type, entity.entity_value, entity.id
+            )
             mapped.raw_alert_payload.entity_id = entity.id
             mapped.normalized_event_payload.entity_id = entity.id
 
         raw_alert, was_duplicate = persistence.persist_raw_alert(mapped.raw_alert_payload)
         if was_duplicate:
-            logger.info(f"Skipped duplicate alert: {mapped.raw_alert_payload.dedupe_hash}")
+            logger.info("Skipped duplicate alert: %s", mapped.raw_alert_payload.dedupe_hash)
             return {
                 "status": "skipped",
                 "reason": "duplicate",
                 "dedupe_hash": mapped.raw_alert_payload.dedupe_hash,
             }
 
-        logger.debug(f"Persisted raw_alert (id={raw_alert.id})")
+        logger.debug("Persisted raw_alert (id=%s)", raw_alert.id)
 
         mapped.normalized_event_payload.raw_alert_id = raw_alert.id
         normalized_event, _ = persistence.persist_normalized_event(mapped.normalized_event_payload)
         if normalized_event:
-            logger.debug(f"Persisted normalized_event (id={normalized_event.id})")
+            logger.debug("Persisted normalized_event (id=%s)", normalized_event.id)
 
         return {
             "status": "success",
@@ -1,18 +1,22 @@
 from __future__ import annotations
 
 import argparse
-import json
 import logging
+import queue
 import sys
+import threading
+import time
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 from ueba.config.mapping_loader import load as load_mappings
 from ueba.db.base import get_session_factory
+from ueba.utils import json_codec
 
 from .inputs import AlertInputSource, FileTailSource, MessageQueueStubSource, StdInSource
 from .mapper import AlertMapper
-from .persistence import PersistenceManager
+from .persistence import PersistenceManager, RawAlertBatcher
+from .utils import compute_alert_hash
 
 logging.basicConfig(
     level=logging.INFO,
@@ -22,14 +26,51 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+_END_OF_INPUT = object()
+
+
+def _read_alerts(
+    input_source: AlertInputSource,
+    alert_queue: "queue.Queue[Any]",
+    failures: List[BaseException],
+) -> None:
+    # Input errors are handed back to the main thread, which re-raises them once the
+    # alerts read so far are written, so a broken input still fails the run.
+    try:
+        for alert in input_source:
+            alert_queue.put(alert)
+    except Exception as e:
+        failures.append(e)
+    finally:
+        alert_queue.put(_END_OF_INPUT)
+
+
+def _next_batch_target(target: int, backlog: bool, min_batch: int, max_batch: int) -> int:
+    """Grow the batch while input is queued up, shrink it when the input goes quiet."""
+    if backlog:
+        return min(target * 2, max_batch)
+    return max(target // 2, min_batch)
+
+
 def run_mapper_service(
     input_source: AlertInputSource,
     source_name: str = "wazuh",
     database_url: Optional[str] = None,
     mapping_paths: Optional[list] = None,
     batch_size: int = 100,
+    flush_interval: float = 0.1,
+    min_batch_size: Optional[int] = None,
 ) -> None:
-    logger.info(f"Starting mapper service (source={source_name}, batch_size={batch_size})")
+    """
+    Map and persist alerts from ``input_source`` in adaptively sized batches.
+
+    Batches start at ``min_batch_size`` (default ``batch_size // 10``) and double while
+    the reader has a backlog, up to ``batch_size``; an idle flush halves them again.
+    """
+    if min_batch_size is None:
+        min_batch_size = max(batch_size // 10, 1)
+    min_batch_size = min(min_batch_size, batch_size)
+    logger.info("Starting mapper service (source=%s, batch_size=%d)", source_name, batch_size)
 
     resolver = load_mappings(mapping_paths)
     logger.info("Loaded mapping configuration")
@@ -43,29 +84,115 @@ def run_mapper_service(
 
     with SessionFactory() as session:
         persistence = PersistenceManager(session)
+        batcher = RawAlertBatcher(persistence)
+        pending_alerts: List[Dict[str, Any]] = []
 
-        for alert in input_source:
+        def process_batch() -> None:
+            nonlocal processed, skipped, errors
+            if not pending_alerts:
+                return
+
+            # One IN query per batch; known duplicates skip mapping and entity upserts.
+            hashes = [compute_alert_hash(alert) for alert in pending_alerts]
             try:
-                result = mapper.map_and_persist(alert, persistence, source=source_name)
-                if result["status"] == "success":
-                    processed += 1
-                elif result["status"] == "skipped":
-                    skipped += 1
+                existing = persistence.existing_dedupe_hashes(hashes)
+            except Exception as e:
+                errors += len(pending_alerts)
+                logger.error("Error checking batch for duplicates: %s", e, exc_info=True)
+                pending_alerts.clear()
+                session.rollback()
+                return
 
-                if (processed + skipped) % batch_size == 0:
-                    session.commit()
-                    logger.info(
-                        f"Checkpoint: processed={processed}, skipped={skipped}, errors={errors}"
+            mapped_alerts = []
+            for alert, dedupe_hash in zip(pending_alerts, hashes):
+                if dedupe_hash in existing:
+                    skipped += 1
+                    continue
+                try:
+                    mapped_alerts.append(
+                        mapper.map_alert(alert, source=source_name, dedupe_hash=dedupe_hash)
                     )
+                except Exception as e:
+                    errors += 1
+                    logger.error("Error processing alert: %s", e, exc_info=True)
+            pending_alerts.clear()
+
+            try:
+                # All entities in the batch are upserted with one statement.
+                entity_ids = persistence.upsert_entities(
+                    mapped.entity_payload for mapped in mapped_alerts if mapped.entity_payload
+                )
+                for mapped in mapped_alerts:
+                    if mapped.entity_payload:
+                        entity_id = entity_ids[
+                            (mapped.entity_payload.entity_type, mapped.entity_payload.entity_value)
+                        ]
+                        mapped.raw_alert_payload.entity_id = entity_id
+                        mapped.normalized_event_payload.entity_id = entity_id
+                    batcher.add(mapped.raw_alert_payload, mapped.normalized_event_payload)
 
+                inserted, duplicates = batcher.flush(check_existing=False)
+                session.commit()
             except Exception as e:
-                errors += 1
-                logger.error(f"Error processing alert: {e}", exc_info=True)
+                errors += len(mapped_alerts)
+                logger.error(
+                    "Error persisting batch of %d alert(s): %s", len(mapped_alerts), e, exc_info=True
+                )
+                batcher.clear()
                 session.rollback()
+                return
+            processed += inserted
+            skipped += duplicates
+
+        # A reader thread parses input into a bounded queue so reading overlaps the
+        # database round-trips below; the queue applies backpressure when writes lag.
+        alert_queue: "queue.Queue[Any]" = queue.Queue(maxsize=2 * batch_size)
+        reader_failures: List[BaseException] = []
+        reader = threading.Thread(
+            target=_read_alerts,
+            args=(input_source, alert_queue, reader_failures),
+            name="mapper-reader",
+            daemon=True,
+        )
+        reader.start()
+
+        batch_deadline = 0.0
+        target = min_batch_size
+        while True:
+            # Block indefinitely while idle; once a batch has started, wait at most until
+            # its deadline so quiet inputs still get written promptly.
+            timeout = max(batch_deadline - time.monotonic(), 0.0) if pending_alerts else None
+            try:
+                alert = alert_queue.get(timeout=timeout)
+            except queue.Empty:
+                flushed = len(pending_alerts)
+                process_batch()
+                target = _next_batch_target(target, False, min_batch_size, batch_size)
+                logger.debug("Flushed %d alert(s) after idle; next batch target %d", flushed, target)
+                continue
+            if alert is _END_OF_INPUT:
+                break
 
-        session.commit()
+            if not pending_alerts:
+                batch_deadline = time.monotonic() + flush_interval
+            pending_alerts.append(alert)
+            if len(pending_alerts) >= target:
+                process_batch()
+                if not alert_queue.empty():
+                    target = _next_batch_target(target, True, min_batch_size, batch_size)
+                logger.debug("Flushed full batch; next batch target %d", target)
+                logger.info(
+                    "Checkpoint: processed=%d, skipped=%d, errors=%d", processed, skipped, errors
+                )
 
-    logger.info(f"Mapper service completed: processed={processed}, skipped={skipped}, errors={errors}")
+        process_batch()
+        reader.join()
+        if reader_failures:
+            raise reader_failures[0]
+
+    logger.info(
+        "Mapper service completed: processed=%d, skipped=%d, errors=%d", processed, skipped, errors
+    )
 
 
 def main() -> None:
@@ -106,7 +233,18 @@ def main() -> None:
         "--batch-size",
         type=int,
         default=100,
-        help="Commit batch size (default: 100)",
+        help="Maximum alerts written and committed per batch (default: 100)",
+    )
+    parser.add_argument(
+        "--min-batch-size",
+        type=int,
+        help="Smallest adaptive batch size (default: a tenth of --batch-size)",
+    )
+    parser.add_argument(
+        "--flush-interval",
+        type=float,
+        default=0.1,
+        help="Seconds to wait for a batch to fill before writing it anyway (default: 0.1)",
     )
     parser.add_argument(
         "--log-level",
@@ -129,7 +267,7 @@ def main() -> None:
         input_source = FileTailSource(args.file, follow=args.follow)
     elif args.input == "queue":
         logger.warning("Message queue stub - reading from stdin as JSON array")
-        data = json.loads(sys.stdin.read())
+        data = json_codec.loads(sys.stdin.buffer.read())
         if not isinstance(data, list):
             parser.error("Expected JSON array for queue stub")
         input_source = MessageQueueStubSource(data)
@@ -142,6 +280,8 @@ def main() -> None:
         database_url=args.database_url,
         mapping_paths=args.mapping_paths,
         batch_size=args.batch_size,
+        flush_interval=args.flush_interval,
+        min_batch_size=args.min_batch_size,
     )
 
 
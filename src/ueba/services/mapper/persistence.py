@@ -1,16 +1,17 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
 from datetime import datetime
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
-from sqlalchemy import select
+from sqlalchemy import func, insert, select, tuple_
 from sqlalchemy.orm import Session
 
 from ueba.db.models import Entity, NormalizedEvent, RawAlert
+from ueba.utils.compat import DATACLASS_SLOTS
 
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class EntityPayload:
     entity_type: str
     entity_value: str
@@ -18,7 +19,7 @@ class EntityPayload:
     attributes: Optional[Dict[str, Any]]
 
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class RawAlertPayload:
     dedupe_hash: str
     entity_id: Optional[int]
@@ -31,7 +32,7 @@ class RawAlertPayload:
     enrichment_context: Optional[Dict[str, Any]]
 
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class NormalizedEventPayload:
     raw_alert_id: Optional[int]
     entity_id: Optional[int]
@@ -43,6 +44,15 @@ class NormalizedEventPayload:
     original_payload: Optional[Dict[str, Any]]
 
 
+_RAW_ALERT_FIELDS = tuple(f.name for f in fields(RawAlertPayload))
+_NORMALIZED_EVENT_FIELDS = tuple(f.name for f in fields(NormalizedEventPayload))
+
+
+def _row(payload: Any, names: Tuple[str, ...]) -> Dict[str, Any]:
+    # Shallow on purpose: asdict() would deep-copy every alert payload.
+    return {name: getattr(payload, name) for name in names}
+
+
 class PersistenceManager:
     """Handles database persistence and idempotency guards."""
 
@@ -75,6 +85,107 @@ class PersistenceManager:
 
         return entity
 
+    def upsert_entities(self, payloads: Iterable[EntityPayload]) -> Dict[Tuple[str, str], int]:
+        """
+        Upsert many entities and return their ids keyed by ``(entity_type, entity_value)``.
+
+        Existing rows are read with one query, merged in Python with the same rules as
+        ``upsert_entity`` and written back with a single INSERT ... ON CONFLICT DO UPDATE.
+        Rows that would not change are not rewritten.
+        """
+        merged: Dict[Tuple[str, str], EntityPayload] = {}
+        for payload in payloads:
+            key = (payload.entity_type, payload.entity_value)
+            current = merged.get(key)
+            if current is None:
+                merged[key] = EntityPayload(
+                    entity_type=payload.entity_type,
+                    entity_value=payload.entity_value,
+                    display_name=payload.display_name,
+                    attributes=dict(payload.attributes or {}),
+                )
+                continue
+            if payload.display_name:
+                current.display_name = payload.display_name
+            if payload.attributes:
+                current.attributes.update(payload.attributes)
+        if not merged:
+            return {}
+
+        dialect = self.session.get_bind().dialect.name
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        elif dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        else:
+            return {
+                key: self.upsert_entity(payload).id for key, payload in merged.items()
+            }
+
+        existing_stmt = select(
+            Entity.id,
+            Entity.entity_type,
+            Entity.entity_value,
+            Entity.display_name,
+            Entity.attributes,
+        ).where(tuple_(Entity.entity_type, Entity.entity_value).in_(sorted(merged)))
+
+        entity_ids: Dict[Tuple[str, str], int] = {}
+        rows: List[Dict[str, Any]] = []
+        for entity_id, entity_type, entity_value, display_name, attributes in self.session.execute(
+            existing_stmt
+        ):
+            key = (entity_type, entity_value)
+            payload = merged.pop(key)
+            new_display_name = payload.display_name or display_name
+            new_attributes = dict(attributes or {})
+            new_attributes.update(payload.attributes)
+            if new_display_name == display_name and new_attributes == (attributes or {}):
+                entity_ids[key] = entity_id
+                continue
+            rows.append(
+                {
+                    "entity_type": entity_type,
+                    "entity_value": entity_value,
+                    "display_name": new_display_name,
+                    "attributes": new_attributes,
+                }
+            )
+        for payload in merged.values():
+            rows.append(
+                {
+                    "entity_type": payload.entity_type,
+                    "entity_value": payload.entity_value,
+                    "display_name": payload.display_name,
+                    "attributes": payload.attributes,
+                }
+            )
+
+        if rows:
+            stmt = upsert(Entity).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Entity.entity_type, Entity.entity_value],
+                set_={
+                    "display_name": stmt.excluded.display_name,
+                    "attributes": stmt.excluded.attributes,
+                    "updated_at": func.now(),
+                },
+            ).returning(Entity.id, Entity.entity_type, Entity.entity_value)
+            for entity_id, entity_type, entity_value in self.session.execute(stmt):
+                entity_ids[(entity_type, entity_value)] = entity_id
+
+        return entity_ids
+
+    def existing_dedupe_hashes(self, hashes: Iterable[str]) -> Dict[str, int]:
+        """Map each already-stored dedupe hash to its raw alert id in one query."""
+        unique_hashes = set(hashes)
+        if not unique_hashes:
+            return {}
+        stmt = select(RawAlert.dedupe_hash, RawAlert.id).where(
+            RawAlert.dedupe_hash.in_(sorted(unique_hashes))
+        )
+        return {dedupe_hash: raw_alert_id for dedupe_hash, raw_alert_id in self.session.execute(stmt)}
+
     def persist_raw_alert(self, payload: RawAlertPayload) -> Tuple[RawAlert, bool]:
         stmt = select(RawAlert).where(RawAlert.dedupe_hash == payload.dedupe_hash)
         existing: Optional[RawAlert] = self.session.execute(stmt).scalar_one_or_none()
@@ -121,3 +232,70 @@ class PersistenceManager:
         self.session.add(normalized_event)
         self.session.flush()
         return normalized_event, False
+
+
+class RawAlertBatcher:
+    """
+    Buffers mapped alerts and writes them with one INSERT per table on ``flush``.
+
+    Duplicates are resolved against the database with a single dedupe-hash lookup per
+    flush, and against earlier alerts in the same batch.
+    """
+
+    def __init__(self, persistence: PersistenceManager) -> None:
+        self.persistence = persistence
+        self.raw_payloads: List[RawAlertPayload] = []
+        self.norm_payloads: List[NormalizedEventPayload] = []
+
+    def __len__(self) -> int:
+        return len(self.raw_payloads)
+
+    def add(self, raw_payload: RawAlertPayload, normalized_payload: NormalizedEventPayload) -> None:
+        self.raw_payloads.append(raw_payload)
+        self.norm_payloads.append(normalized_payload)
+
+    def clear(self) -> None:
+        self.raw_payloads.clear()
+        self.norm_payloads.clear()
+
+    def flush(self, check_existing: bool = True) -> Tuple[int, int]:
+        """
+        Write pending alerts and return ``(inserted, duplicates)``.
+
+        Pass ``check_existing=False`` when the caller already filtered out hashes that
+        are stored; duplicates within the batch are still skipped.
+        """
+        if not self.raw_payloads:
+            return 0, 0
+
+        session = self.persistence.session
+        seen = set()
+        if check_existing:
+            seen.update(
+                self.persistence.existing_dedupe_hashes(p.dedupe_hash for p in self.raw_payloads)
+            )
+        raw_rows: List[Dict[str, Any]] = []
+        pending_events: List[Tuple[str, NormalizedEventPayload]] = []
+        for raw_payload, normalized_payload in zip(self.raw_payloads, self.norm_payloads):
+            if raw_payload.dedupe_hash in seen:
+                continue
+            seen.add(raw_payload.dedupe_hash)
+            raw_rows.append(_row(raw_payload, _RAW_ALERT_FIELDS))
+            pending_events.append((raw_payload.dedupe_hash, normalized_payload))
+
+        duplicates = len(self.raw_payloads) - len(raw_rows)
+        if raw_rows:
+            inserted = session.execute(
+                insert(RawAlert).returning(RawAlert.dedupe_hash, RawAlert.id), raw_rows
+            )
+            raw_alert_ids = {dedupe_hash: raw_alert_id for dedupe_hash, raw_alert_id in inserted}
+
+            event_rows = []
+            for dedupe_hash, normalized_payload in pending_events:
+                row = _row(normalized_payload, _NORMALIZED_EVENT_FIELDS)
+                row["raw_alert_id"] = raw_alert_ids[dedupe_hash]
+                event_rows.append(row)
+            session.execute(insert(NormalizedEvent), event_rows)
+
+        self.clear()
+        return len(raw_rows), duplicates
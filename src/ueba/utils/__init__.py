@@ -1,3 +1,4 @@
+from .cache import TTLCache
 from .env import get_env_int, get_env_float
 
-__all__ = ["get_env_int", "get_env_float"]
+__all__ = ["TTLCache", "get_env_int", "get_env_float"]
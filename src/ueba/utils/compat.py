@@ -0,0 +1,9 @@
+"""Small shims for features that depend on the running Python version."""
+
+from __future__ import annotations
+
+import sys
+from typing import Any, Dict
+
+# ``dataclass(slots=True)`` needs Python 3.10; on 3.9 the classes keep their ``__dict__``.
+DATACLASS_SLOTS: Dict[str, Any] = {"slots": True} if sys.version_info >= (3, 10) else {}
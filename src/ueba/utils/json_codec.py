@@ -0,0 +1,48 @@
+"""JSON encoding and decoding helpers that use orjson when it is installed."""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Union
+
+try:  # pragma: no cover - exercised only when the speedups extra is installed
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+HAS_ORJSON = orjson is not None
+
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers can catch this in either case.
+JSONDecodeError = json.JSONDecodeError
+
+
+def loads(data: Union[str, bytes, bytearray]) -> Any:
+    """Decode a JSON document, preferring orjson's C parser when available."""
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps_line(obj: Any, *, sort_keys: bool = False) -> bytes:
+    """Encode ``obj`` as a newline-terminated UTF-8 JSON line."""
+    if HAS_ORJSON:
+        option = orjson.OPT_APPEND_NEWLINE
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, option=option)
+    return (json.dumps(obj, sort_keys=sort_keys) + "\n").encode("utf-8")
+
+
+def dumps(obj: Any, *, sort_keys: bool = False) -> str:
+    """Encode ``obj`` as a JSON string.
+
+    orjson output is compact; the stdlib fallback keeps its default separators, so stored
+    text only changes when the speedups extra is installed.
+    """
+    if HAS_ORJSON:
+        # Non-string keys are coerced like the stdlib encoder does instead of raising.
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, option=option).decode("utf-8")
+    return json.dumps(obj, sort_keys=sort_keys)
@@ -2,14 +2,17 @@ from __future__ import annotations
 
 import json
 from datetime import datetime, timedelta, timezone
-from pathlib import Path
 from typing import Generator
 
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, insert
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 
+from ueba.api import auth
+from ueba.api.routers import entities as entities_router
+from ueba.api.routers import health
 from ueba.api.dependencies import get_session
 from ueba.api.main import app
 from ueba.db.base import Base
@@ -19,17 +22,74 @@ from ueba.db.models import Entity, NormalizedEvent, EntityRiskHistory
 UTC = timezone.utc
 
 
-@pytest.fixture()
-def session_factory(tmp_path: Path):
-    """Create an in-memory SQLite database session factory for tests."""
-    db_path = tmp_path / "test.db"
-    engine = create_engine(f"sqlite:///{db_path}", future=True)
+def _begin_sqlite_transactions_explicitly(engine) -> None:
+    # pysqlite defers BEGIN on its own, which breaks SAVEPOINT handling; let SQLAlchemy
+    # emit BEGIN instead so nested transactions behave.
+    @event.listens_for(engine, "connect")
+    def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def _emit_begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+
+def create_entity(session, entity_type: str, value: str) -> int:
+    """Add an entity and return its id without committing.
+
+    Callers commit once at the end of their setup block, which expires the instance, so
+    the id is returned rather than the ORM object.
+    """
+    entity = Entity(entity_type=entity_type, entity_value=value)
+    session.add(entity)
+    session.flush()
+    return entity.id
+
+
+def bulk_insert(session, model, rows, **defaults) -> None:
+    """Insert ``rows`` into ``model``'s table with one executemany; ``defaults`` fill each row."""
+    session.execute(insert(model), [{**defaults, **row} for row in rows])
+
+
+@pytest.fixture(scope="session")
+def db_engine():
+    """One in-memory SQLite database with the schema built once for the whole run."""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+        future=True,
+    )
+    _begin_sqlite_transactions_explicitly(engine)
     Base.metadata.create_all(bind=engine)
-    SessionFactory = sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+
+
+@pytest.fixture()
+def session_factory(db_engine):
+    """
+    Session factory whose sessions share one outer transaction per test.
+
+    Each session commits to a SAVEPOINT, so data is visible across sessions within a test,
+    and the outer transaction is rolled back on teardown to leave the schema empty.
+    """
+    connection = db_engine.connect()
+    transaction = connection.begin()
+    SessionFactory = sessionmaker(
+        bind=connection,
+        autocommit=False,
+        autoflush=False,
+        future=True,
+        join_transaction_mode="create_savepoint",
+    )
     try:
         yield SessionFactory
     finally:
-        Base.metadata.drop_all(bind=engine)
+        transaction.rollback()
+        connection.close()
 
 
 @pytest.fixture()
@@ -58,6 +118,9 @@ def client(session_factory, monkeypatch: pytest.MonkeyPatch):
     # Set test credentials
     monkeypatch.setenv("UEBA_DASH_USERNAME", "testuser")
     monkeypatch.setenv("UEBA_DASH_PASSWORD", "testpass")
+    auth._load_credentials.cache_clear()
+    health._settings_cache.clear()
+    entities_router._entity_count_cache.clear()
 
     client = TestClient(app)
     yield client
@@ -142,6 +205,7 @@ def sample_risk_history(session, sample_entities) -> dict:
             risk_score=risk_score,
             observed_at=obs_time,
             reason=json.dumps(reason_dict),
+            generator="analyzer_service",
         )
         session.add(history)
         records.append(history)
@@ -162,3 +162,89 @@ def test_alert_logger_timestamp_is_iso_format(tmp_path: Path):
     from datetime import datetime
     timestamp = datetime.fromisoformat(alert["timestamp"])
     assert timestamp is not None
+
+
+def test_alert_logger_reopens_after_close(tmp_path: Path):
+    log_path = tmp_path / "alerts.log"
+
+    with AlertLogger(log_path) as logger:
+        logger.log_anomaly(
+            entity_id=1,
+            risk_score=80.0,
+            baseline_avg=40.0,
+            baseline_sigma=5.0,
+            delta=40.0,
+            triggered_rules=[],
+        )
+    # Writing after close reopens the file in append mode.
+    logger.log_anomaly(
+        entity_id=2,
+        risk_score=81.0,
+        baseline_avg=40.0,
+        baseline_sigma=5.0,
+        delta=41.0,
+        triggered_rules=[],
+    )
+    logger.close()
+
+    lines = log_path.read_text().strip().split("\n")
+    assert [json.loads(line)["entity_id"] for line in lines] == [1, 2]
+
+
+def test_alert_logger_buffers_until_flush(tmp_path: Path):
+    log_path = tmp_path / "alerts.log"
+    logger = AlertLogger(log_path, flush_bytes=1 << 20, flush_interval_s=3600)
+
+    for entity_id in range(3):
+        logger.log_anomaly(
+            entity_id=entity_id,
+            risk_score=80.0,
+            baseline_avg=40.0,
+            baseline_sigma=5.0,
+            delta=40.0,
+            triggered_rules=[],
+        )
+
+    assert not log_path.exists() or log_path.read_text() == ""
+
+    logger.flush()
+    lines = log_path.read_text().strip().split("\n")
+    assert [json.loads(line)["entity_id"] for line in lines] == [0, 1, 2]
+    logger.close()
+
+
+def test_alert_logger_flushes_when_buffer_is_full(tmp_path: Path):
+    log_path = tmp_path / "alerts.log"
+    logger = AlertLogger(log_path, flush_bytes=1, flush_interval_s=3600)
+
+    logger.log_anomaly(
+        entity_id=7,
+        risk_score=80.0,
+        baseline_avg=40.0,
+        baseline_sigma=5.0,
+        delta=40.0,
+        triggered_rules=[],
+    )
+
+    assert json.loads(log_path.read_text())["entity_id"] == 7
+    logger.close()
+
+
+def test_alert_logger_drains_buffer_at_exit(tmp_path: Path):
+    from ueba.logging.alert_logger import _flush_live_loggers
+
+    log_path = tmp_path / "alerts.log"
+    logger = AlertLogger(log_path, flush_bytes=1 << 20, flush_interval_s=3600)
+    logger.log_anomaly(
+        entity_id=7,
+        risk_score=80.0,
+        baseline_avg=10.0,
+        baseline_sigma=1.0,
+        delta=70.0,
+        triggered_rules=[],
+    )
+    assert not log_path.exists()
+
+    _flush_live_loggers()
+
+    assert json.loads(log_path.read_text())["entity_id"] == 7
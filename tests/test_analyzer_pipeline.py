@@ -150,6 +150,20 @@ def test_simple_scoring_with_severity():
     assert score == 40.0  # (5*2) + (10/10 * 30) = 10 + 30 = 40
 
 
+def test_simple_scoring_severity_is_exact():
+    features = ExtractedFeatures(
+        event_count=1,
+        highest_severity=7,
+        last_observed_at=datetime.now(timezone.utc),
+        event_types=["alert"],
+    )
+
+    score = SimpleScoring().calculate_score(100, features, RuleEvaluation())
+
+    # 7/10*30 in floats is 20.999999999999996; the integer form is exact.
+    assert score == 23.0
+
+
 def test_simple_scoring_with_rules():
     features = ExtractedFeatures(
         event_count=5,
@@ -1,30 +1,17 @@
 from __future__ import annotations
 
 from datetime import datetime, timedelta, timezone
-from pathlib import Path
 
 import pytest
-from sqlalchemy import create_engine, select
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import select
 
-from ueba.db.base import Base
+from tests.conftest import bulk_insert
 from ueba.db.models import Entity, EntityRiskHistory, NormalizedEvent
 from ueba.services.analyzer import AnalyzerRepository
+from ueba.services.analyzer.repository import _extract_severity_from_payload
 from ueba.services.analyzer.pipeline import AnalyzerResult, ExtractedFeatures, RuleEvaluation
 
 
-@pytest.fixture
-def session_factory(tmp_path: Path):
-    db_path = tmp_path / "test_analyzer.db"
-    engine = create_engine(f"sqlite:///{db_path}", future=True)
-    Base.metadata.create_all(bind=engine)
-    SessionFactory = sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
-    try:
-        yield SessionFactory
-    finally:
-        Base.metadata.drop_all(bind=engine)
-
-
 @pytest.fixture
 def sample_entity(session_factory):
     with session_factory() as session:
@@ -39,23 +26,17 @@ def test_fetch_entity_event_windows_groups_by_entity_and_day(session_factory, sa
         # Create events over two days for one entity
         base_time = datetime(2024, 1, 15, 10, 0, 0, tzinfo=timezone.utc)
 
-        for i in range(3):
-            event = NormalizedEvent(
-                entity_id=sample_entity,
-                event_type="login",
-                observed_at=base_time + timedelta(hours=i),
-            )
-            session.add(event)
+        events = [
+            {"event_type": "login", "observed_at": base_time + timedelta(hours=i)} for i in range(3)
+        ]
 
         # Next day
         next_day = base_time + timedelta(days=1)
-        for i in range(2):
-            event = NormalizedEvent(
-                entity_id=sample_entity,
-                event_type="file_access",
-                observed_at=next_day + timedelta(hours=i),
-            )
-            session.add(event)
+        events += [
+            {"event_type": "file_access", "observed_at": next_day + timedelta(hours=i)}
+            for i in range(2)
+        ]
+        bulk_insert(session, NormalizedEvent, events, entity_id=sample_entity)
 
         session.commit()
 
@@ -75,26 +56,15 @@ def test_fetch_entity_event_windows_filters_by_time(session_factory, sample_enti
         base_time = datetime(2024, 1, 15, 12, 0, 0, tzinfo=timezone.utc)
 
         # Events before, during, and after the window
-        session.add(
-            NormalizedEvent(
-                entity_id=sample_entity,
-                event_type="before",
-                observed_at=base_time - timedelta(days=1),
-            )
-        )
-        session.add(
-            NormalizedEvent(
-                entity_id=sample_entity,
-                event_type="during",
-                observed_at=base_time,
-            )
-        )
-        session.add(
-            NormalizedEvent(
-                entity_id=sample_entity,
-                event_type="after",
-                observed_at=base_time + timedelta(days=2),
-            )
+        bulk_insert(
+            session,
+            NormalizedEvent,
+            [
+                {"event_type": "before", "observed_at": base_time - timedelta(days=1)},
+                {"event_type": "during", "observed_at": base_time},
+                {"event_type": "after", "observed_at": base_time + timedelta(days=2)},
+            ],
+            entity_id=sample_entity,
         )
         session.commit()
 
@@ -113,37 +83,18 @@ def test_fetch_entity_event_windows_ignores_deleted_and_inactive(session_factory
     with session_factory() as session:
         base_time = datetime(2024, 1, 15, 12, 0, 0, tzinfo=timezone.utc)
 
-        # Active event
-        session.add(
-            NormalizedEvent(
-                entity_id=sample_entity,
-                event_type="active",
-                observed_at=base_time,
-                status="active",
-            )
-        )
-
-        # Deleted event
-        session.add(
-            NormalizedEvent(
-                entity_id=sample_entity,
-                event_type="deleted",
-                observed_at=base_time,
-                status="active",
-                deleted_at=base_time,
-            )
-        )
-
-        # Inactive event
-        session.add(
-            NormalizedEvent(
-                entity_id=sample_entity,
-                event_type="inactive",
-                observed_at=base_time,
-                status="inactive",
-            )
+        # Active, deleted and inactive events in one executemany; every row needs the same keys.
+        bulk_insert(
+            session,
+            NormalizedEvent,
+            [
+                {"event_type": "active", "status": "active", "deleted_at": None},
+                {"event_type": "deleted", "status": "active", "deleted_at": base_time},
+                {"event_type": "inactive", "status": "inactive", "deleted_at": None},
+            ],
+            entity_id=sample_entity,
+            observed_at=base_time,
         )
-
         session.commit()
 
         repo = AnalyzerRepository(session)
@@ -154,6 +105,39 @@ def test_fetch_entity_event_windows_ignores_deleted_and_inactive(session_factory
         assert windows[0].events[0].event_type == "active"
 
 
+def test_fetch_entity_event_windows_resolves_severity(session_factory, sample_entity):
+    with session_factory() as session:
+        base_time = datetime(2024, 1, 15, 12, 0, 0, tzinfo=timezone.utc)
+        session.add_all(
+            [
+                NormalizedEvent(
+                    entity_id=sample_entity,
+                    event_type="normalized",
+                    observed_at=base_time,
+                    normalized_payload={"severity": 7},
+                    original_payload={"data": {"severity": 2}},
+                ),
+                NormalizedEvent(
+                    entity_id=sample_entity,
+                    event_type="original",
+                    observed_at=base_time + timedelta(minutes=1),
+                    original_payload={"data": {"severity": "4"}},
+                ),
+                NormalizedEvent(
+                    entity_id=sample_entity,
+                    event_type="risk_score",
+                    observed_at=base_time + timedelta(minutes=2),
+                    risk_score=3.6,
+                ),
+            ]
+        )
+        session.commit()
+
+        windows = AnalyzerRepository(session).fetch_entity_event_windows()
+
+        assert [event.severity for event in windows[0].events] == [7, 4, 3]
+
+
 def test_persist_result_creates_new_history(session_factory, sample_entity):
     with session_factory() as session:
         base_time = datetime(2024, 1, 15, 0, 0, 0, tzinfo=timezone.utc)
@@ -235,6 +219,7 @@ def test_persist_result_updates_existing_history(session_factory, sample_entity)
         histories = session.execute(select(EntityRiskHistory)).scalars().all()
         assert len(histories) == 1
         assert histories[0].risk_score == 45.0
+        assert histories[0].generator == "analyzer_service"
 
 
 def test_get_latest_checkpoint_returns_none_when_empty(session_factory):
@@ -247,6 +232,7 @@ def test_get_latest_checkpoint_returns_none_when_empty(session_factory):
 def test_get_latest_checkpoint_returns_max_observed_at(session_factory, sample_entity):
     with session_factory() as session:
         base_time = datetime(2024, 1, 15, 0, 0, 0, tzinfo=timezone.utc)
+        repo = AnalyzerRepository(session)
 
         for i in range(3):
             result = AnalyzerResult(
@@ -262,7 +248,6 @@ def test_get_latest_checkpoint_returns_max_observed_at(session_factory, sample_e
                 rule_evaluation=RuleEvaluation(),
                 risk_score=10.0,
             )
-            repo = AnalyzerRepository(session)
             repo.persist_result(result)
 
         session.commit()
@@ -270,3 +255,132 @@ def test_get_latest_checkpoint_returns_max_observed_at(session_factory, sample_e
         checkpoint = repo.get_latest_checkpoint()
         assert checkpoint is not None
         assert checkpoint == base_time + timedelta(days=3)
+
+
+def test_get_latest_checkpoint_ignores_other_generators_and_deleted_rows(session_factory, sample_entity):
+    with session_factory() as session:
+        base_time = datetime(2024, 1, 15, 0, 0, 0, tzinfo=timezone.utc)
+        session.add_all(
+            [
+                EntityRiskHistory(
+                    entity_id=sample_entity,
+                    risk_score=10.0,
+                    observed_at=base_time,
+                    generator="analyzer_service",
+                ),
+                EntityRiskHistory(
+                    entity_id=sample_entity,
+                    risk_score=10.0,
+                    observed_at=base_time + timedelta(days=1),
+                    generator="manual_import",
+                ),
+                EntityRiskHistory(
+                    entity_id=sample_entity,
+                    risk_score=10.0,
+                    observed_at=base_time + timedelta(days=2),
+                    generator="analyzer_service",
+                    deleted_at=base_time + timedelta(days=3),
+                ),
+            ]
+        )
+        session.commit()
+
+        assert AnalyzerRepository(session).get_latest_checkpoint() == base_time
+
+
+def _daily_result(entity_id: int, window_start: datetime, risk_score: float) -> AnalyzerResult:
+    return AnalyzerResult(
+        entity_id=entity_id,
+        window_start=window_start,
+        window_end=window_start + timedelta(days=1),
+        features=ExtractedFeatures(
+            event_count=1,
+            highest_severity=None,
+            last_observed_at=window_start,
+            event_types=["test"],
+        ),
+        rule_evaluation=RuleEvaluation(),
+        risk_score=risk_score,
+    )
+
+
+def test_persist_results_upserts_in_bulk(session_factory, sample_entity):
+    base_time = datetime(2024, 1, 15, 0, 0, 0, tzinfo=timezone.utc)
+
+    with session_factory() as session:
+        repo = AnalyzerRepository(session)
+        repo.persist_results(
+            [_daily_result(sample_entity, base_time + timedelta(days=i), 10.0) for i in range(3)]
+        )
+        session.commit()
+
+        # Re-running overlapping windows updates them instead of inserting duplicates.
+        repo.persist_results(
+            [_daily_result(sample_entity, base_time + timedelta(days=i), 50.0) for i in range(2, 4)]
+        )
+        session.commit()
+
+        histories = session.execute(
+            select(EntityRiskHistory).order_by(EntityRiskHistory.observed_at)
+        ).scalars().all()
+        assert [history.risk_score for history in histories] == [10.0, 10.0, 50.0, 50.0]
+        assert all(history.generator == "analyzer_service" for history in histories)
+        assert repo.get_latest_checkpoint() == base_time + timedelta(days=4)
+
+
+def test_persist_results_skips_unchanged_rows(session_factory, sample_entity):
+    base_time = datetime(2024, 1, 15, 0, 0, 0, tzinfo=timezone.utc)
+    stale = datetime(2000, 1, 1)
+
+    with session_factory() as session:
+        repo = AnalyzerRepository(session)
+        repo.persist_results(
+            [_daily_result(sample_entity, base_time + timedelta(days=i), 10.0) for i in range(2)]
+        )
+        session.execute(EntityRiskHistory.__table__.update().values(updated_at=stale))
+        session.commit()
+
+        repo.persist_results(
+            [
+                _daily_result(sample_entity, base_time, 10.0),
+                _daily_result(sample_entity, base_time + timedelta(days=1), 20.0),
+            ]
+        )
+        session.commit()
+
+        updated = session.execute(
+            select(EntityRiskHistory.updated_at).order_by(EntityRiskHistory.observed_at)
+        ).scalars().all()
+        assert updated[0] == stale
+        assert updated[1] != stale
+
+
+def test_persist_result_leaves_unchanged_row_clean(session_factory, sample_entity):
+    base_time = datetime(2024, 1, 15, 0, 0, 0, tzinfo=timezone.utc)
+
+    with session_factory() as session:
+        repo = AnalyzerRepository(session)
+        repo.persist_result(_daily_result(sample_entity, base_time, 10.0))
+        session.commit()
+
+        history = repo.persist_result(_daily_result(sample_entity, base_time, 10.0))
+        assert history not in session.new
+        assert not session.is_modified(history)
+
+
+@pytest.mark.parametrize(
+    "payload, expected",
+    [
+        ({"severity": "7"}, 7),
+        ({"data": {"severity": 4}}, 4),
+        # An explicit null at the top level does not fall through to data.severity.
+        ({"severity": None, "data": {"severity": 4}}, None),
+        ({"severity": "high", "data": {"severity": 4}}, None),
+        ({"data": "severity"}, None),
+        (["severity"], None),
+        ({}, None),
+        (None, None),
+    ],
+)
+def test_extract_severity_from_payload(payload, expected):
+    assert _extract_severity_from_payload(payload) == expected
@@ -1,51 +1,32 @@
 from __future__ import annotations
 
 import json
+import threading
 from datetime import datetime, timedelta, timezone
-from pathlib import Path
 
 import pytest
-from sqlalchemy import create_engine, select
-from sqlalchemy.orm import sessionmaker
-
-from ueba.db.base import Base
-from ueba.db.models import Entity, EntityRiskHistory, NormalizedEvent
+from sqlalchemy import delete, func, select
+
+from tests.conftest import bulk_insert, create_entity
+from ueba.db.models import EntityRiskHistory, NormalizedEvent
+from ueba.logging import AlertLogger
+from ueba.services.analyzer.pipeline import AnalyzerPipeline
+from ueba.services.analyzer import service as service_module
+from ueba.services.analyzer.repository import AnalyzerRepository, EntityEventWindow
 from ueba.services.analyzer.service import AnalyzerService
 
 
 @pytest.fixture()
-def session_factory(tmp_path: Path):
-    db_path = tmp_path / "analyzer_service.db"
-    engine = create_engine(f"sqlite:///{db_path}", future=True)
-    Base.metadata.create_all(bind=engine)
-    SessionFactory = sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
+def analyzer_service(session_factory, tmp_path):
+    alert_logger = AlertLogger(tmp_path / "alerts.log")
     try:
-        yield SessionFactory
+        yield AnalyzerService(session_factory=session_factory, alert_logger=alert_logger)
     finally:
-        Base.metadata.drop_all(bind=engine)
-
-
-@pytest.fixture()
-def analyzer_service(session_factory):
-    return AnalyzerService(session_factory=session_factory)
+        alert_logger.close()
 
 
-def _create_entity(session, entity_type: str, value: str) -> Entity:
-    entity = Entity(entity_type=entity_type, entity_value=value)
-    session.add(entity)
-    session.commit()
-    return entity
-
-
-def _add_event(session, entity_id: int, ts: datetime, event_type: str, severity: int) -> None:
-    session.add(
-        NormalizedEvent(
-            entity_id=entity_id,
-            event_type=event_type,
-            observed_at=ts,
-            normalized_payload={"severity": severity},
-        )
-    )
+def _history_count(session) -> int:
+    return session.scalar(select(func.count()).select_from(EntityRiskHistory))
 
 
 def _collect_history(session):
@@ -56,17 +37,31 @@ def test_analyzer_service_rolls_up_events(session_factory, analyzer_service):
     base_time = datetime(2024, 1, 1, 8, 0, 0, tzinfo=timezone.utc)
 
     with session_factory() as session:
-        host = _create_entity(session, "host", "web-1")
-        user = _create_entity(session, "user", "alice")
-
-        # Host events spanning two days
-        _add_event(session, host.id, base_time, "wazuh_auth", 5)
-        _add_event(session, host.id, base_time + timedelta(hours=4), "wazuh_auth", 9)
-        _add_event(session, host.id, base_time + timedelta(days=1, hours=1), "wazuh_dns", 3)
-
-        # User events single day
-        _add_event(session, user.id, base_time + timedelta(hours=2), "login", 7)
-        _add_event(session, user.id, base_time + timedelta(hours=3), "login", 4)
+        host_id = create_entity(session, "host", "web-1")
+        user_id = create_entity(session, "user", "alice")
+
+        events = [
+            # Host events spanning two days
+            (host_id, base_time, "wazuh_auth", 5),
+            (host_id, base_time + timedelta(hours=4), "wazuh_auth", 9),
+            (host_id, base_time + timedelta(days=1, hours=1), "wazuh_dns", 3),
+            # User events single day
+            (user_id, base_time + timedelta(hours=2), "login", 7),
+            (user_id, base_time + timedelta(hours=3), "login", 4),
+        ]
+        bulk_insert(
+            session,
+            NormalizedEvent,
+            [
+                {
+                    "entity_id": entity_id,
+                    "observed_at": ts,
+                    "event_type": event_type,
+                    "normalized_payload": {"severity": severity},
+                }
+                for entity_id, ts, event_type, severity in events
+            ],
+        )
         session.commit()
 
     processed = analyzer_service.run_once(
@@ -77,7 +72,10 @@ def test_analyzer_service_rolls_up_events(session_factory, analyzer_service):
     assert processed == 3  # host day1 + host day2 + user day1
 
     with session_factory() as session:
-        history_rows = _collect_history(session)
+        # Rows are written day by day, so order by entity and window for the assertions.
+        history_rows = sorted(
+            _collect_history(session), key=lambda row: (row.entity_id, row.observed_at)
+        )
         assert len(history_rows) == 3
 
         first = history_rows[0]
@@ -89,13 +87,194 @@ def test_analyzer_service_rolls_up_events(session_factory, analyzer_service):
         assert json.loads(history_rows[1].reason)["event_count"] == 1
 
 
+def test_analyzer_service_processes_windows_in_batches(session_factory, analyzer_service, monkeypatch):
+    monkeypatch.setattr(AnalyzerService, "WINDOW_BATCH_SIZE", 2)
+    base_time = datetime(2024, 1, 1, 8, 0, 0, tzinfo=timezone.utc)
+
+    with session_factory() as session:
+        entity_id = create_entity(session, "host", "web-1")
+        bulk_insert(
+            session,
+            NormalizedEvent,
+            [{"observed_at": base_time + timedelta(days=day)} for day in range(5)],
+            entity_id=entity_id,
+            event_type="wazuh_auth",
+            normalized_payload={"severity": 5},
+        )
+        session.commit()
+
+    processed = analyzer_service.run_once(since=base_time, until=base_time + timedelta(days=6))
+
+    assert processed == 5
+    with session_factory() as session:
+        assert _history_count(session) == 5
+
+
+def test_analyzer_service_skips_idle_days_between_events(session_factory, analyzer_service, monkeypatch):
+    base_time = datetime(2024, 1, 1, 8, 0, 0, tzinfo=timezone.utc)
+
+    with session_factory() as session:
+        entity_id = create_entity(session, "host", "web-1")
+        bulk_insert(
+            session,
+            NormalizedEvent,
+            [{"observed_at": base_time}, {"observed_at": base_time + timedelta(days=400)}],
+            entity_id=entity_id,
+            event_type="wazuh_auth",
+            normalized_payload={"severity": 5},
+        )
+        session.commit()
+
+    slices = []
+    iter_windows = AnalyzerRepository.iter_entity_event_windows
+
+    def record_slice(self, since=None, until=None):
+        slices.append(since)
+        return iter_windows(self, since=since, until=until)
+
+    monkeypatch.setattr(AnalyzerRepository, "iter_entity_event_windows", record_slice)
+    processed = analyzer_service.run_once(
+        since=base_time - timedelta(days=30), until=base_time + timedelta(days=800)
+    )
+
+    assert processed == 2
+    # Each event day costs its own slice plus at most one empty probe after it; the
+    # idle days before, between and after them are skipped.
+    assert slices == [
+        base_time - timedelta(days=30),
+        base_time,
+        datetime(2024, 1, 2, tzinfo=timezone.utc),
+        base_time + timedelta(days=400),
+        datetime(2025, 2, 5, tzinfo=timezone.utc),
+    ]
+
+
+@pytest.mark.parametrize("value, expected", [("3", 3), ("0", 1), ("-2", 1), ("many", 1)])
+def test_analyzer_service_reads_worker_count_from_environment(
+    session_factory, tmp_path, monkeypatch, value, expected
+):
+    monkeypatch.setenv("UEBA_ANALYZER_WORKERS", value)
+    service = AnalyzerService(
+        session_factory=session_factory, alert_logger=AlertLogger(tmp_path / "alerts.log")
+    )
+    assert service.workers == expected
+
+
+def test_analyze_window_requires_an_initialized_worker(monkeypatch):
+    monkeypatch.setattr(service_module, "_worker_pipeline", None)
+    window = EntityEventWindow(
+        entity_id=1,
+        window_start=datetime(2024, 1, 1, tzinfo=timezone.utc),
+        window_end=datetime(2024, 1, 2, tzinfo=timezone.utc),
+        events=[],
+    )
+    with pytest.raises(RuntimeError):
+        service_module._analyze_window(window)
+
+
+def test_analyzer_service_matches_serial_results_with_worker_processes(session_factory, tmp_path):
+    base_time = datetime(2024, 1, 1, 8, 0, 0, tzinfo=timezone.utc)
+
+    with session_factory() as session:
+        for index in range(6):
+            entity_id = create_entity(session, "host", f"web-{index}")
+            bulk_insert(
+                session,
+                NormalizedEvent,
+                [
+                    {
+                        "observed_at": base_time + timedelta(days=day),
+                        "normalized_payload": {"severity": index + day},
+                    }
+                    for day in range(2)
+                ],
+                entity_id=entity_id,
+                event_type="wazuh_auth",
+            )
+        session.commit()
+
+    def run(workers):
+        service = AnalyzerService(
+            session_factory=session_factory,
+            alert_logger=AlertLogger(tmp_path / "alerts.log"),
+            workers=workers,
+        )
+        processed = service.run_once(since=base_time, until=base_time + timedelta(days=2))
+        with session_factory() as session:
+            rows = {
+                (row.entity_id, row.observed_at): (row.risk_score, row.reason)
+                for row in _collect_history(session)
+            }
+            session.execute(delete(EntityRiskHistory))
+            session.commit()
+        return processed, rows
+
+    serial = run(workers=1)
+    parallel = run(workers=2)
+
+    assert serial[0] == parallel[0] == 12
+    assert len(parallel[1]) == 12
+    assert parallel == serial
+
+
+def test_analyzer_service_commits_completed_days_before_a_failure(session_factory, tmp_path):
+    base_time = datetime(2024, 1, 1, 8, 0, 0, tzinfo=timezone.utc)
+    failing_day = base_time.replace(hour=0) + timedelta(days=2)
+
+    class FailingPipeline(AnalyzerPipeline):
+        def analyze(self, **kwargs):
+            if kwargs["window_start"] == failing_day:
+                raise RuntimeError("boom")
+            return super().analyze(**kwargs)
+
+    with session_factory() as session:
+        entity_id = create_entity(session, "host", "web-1")
+        bulk_insert(
+            session,
+            NormalizedEvent,
+            [{"observed_at": base_time + timedelta(days=day)} for day in range(3)],
+            entity_id=entity_id,
+            event_type="wazuh_auth",
+            normalized_payload={"severity": 5},
+        )
+        session.commit()
+
+    service = AnalyzerService(
+        session_factory=session_factory,
+        pipeline=FailingPipeline(),
+        alert_logger=AlertLogger(tmp_path / "alerts.log"),
+    )
+    with pytest.raises(RuntimeError):
+        service.run_once(since=base_time, until=base_time + timedelta(days=4))
+
+    with session_factory() as session:
+        assert _history_count(session) == 2
+
+    # The checkpoint only covers committed days, so a retry picks up the failed one.
+    retry = AnalyzerService(
+        session_factory=session_factory, alert_logger=AlertLogger(tmp_path / "alerts.log")
+    )
+    assert retry.run_once(until=base_time + timedelta(days=4)) == 1
+
+
 def test_analyzer_service_is_idempotent(session_factory, analyzer_service):
     base_time = datetime(2024, 1, 1, 0, 0, 0, tzinfo=timezone.utc)
 
     with session_factory() as session:
-        entity = _create_entity(session, "user", "alice")
-        for hour in range(3):
-            _add_event(session, entity.id, base_time + timedelta(hours=hour), "login", 6 + hour)
+        entity_id = create_entity(session, "user", "alice")
+        bulk_insert(
+            session,
+            NormalizedEvent,
+            [
+                {
+                    "observed_at": base_time + timedelta(hours=hour),
+                    "normalized_payload": {"severity": 6 + hour},
+                }
+                for hour in range(3)
+            ],
+            entity_id=entity_id,
+            event_type="login",
+        )
         session.commit()
 
     processed_first = analyzer_service.run_once(
@@ -123,9 +302,16 @@ def test_analyzer_service_uses_checkpoint(session_factory, analyzer_service):
     base_time = datetime(2024, 1, 1, 0, 0, 0, tzinfo=timezone.utc)
 
     with session_factory() as session:
-        entity = _create_entity(session, "host", "web-1")
+        entity_id = create_entity(session, "host", "web-1")
         # Day 1 events
-        _add_event(session, entity.id, base_time + timedelta(hours=1), "auth", 5)
+        bulk_insert(
+            session,
+            NormalizedEvent,
+            [{"observed_at": base_time + timedelta(hours=1)}],
+            entity_id=entity_id,
+            event_type="auth",
+            normalized_payload={"severity": 5},
+        )
         session.commit()
 
     # First run processes day 1
@@ -136,8 +322,19 @@ def test_analyzer_service_uses_checkpoint(session_factory, analyzer_service):
 
     with session_factory() as session:
         # Day 2 events
-        for hour in range(2):
-            _add_event(session, entity.id, base_time + timedelta(days=1, hours=hour), "dns", 4 + hour)
+        bulk_insert(
+            session,
+            NormalizedEvent,
+            [
+                {
+                    "observed_at": base_time + timedelta(days=1, hours=hour),
+                    "normalized_payload": {"severity": 4 + hour},
+                }
+                for hour in range(2)
+            ],
+            entity_id=entity_id,
+            event_type="dns",
+        )
         session.commit()
 
     # Second run without since should pick up from checkpoint (day 2 only)
@@ -152,3 +349,29 @@ def test_analyzer_service_uses_checkpoint(session_factory, analyzer_service):
         payload = json.loads(latest.reason)
         assert payload["event_count"] == 2
         assert payload["highest_severity"] == 5
+
+
+def test_analyzer_service_run_forever_wakes_on_trigger(analyzer_service, monkeypatch):
+    trigger = threading.Event()
+    calls = []
+
+    def fake_run_once(since=None, until=None):
+        calls.append(since)
+        if len(calls) == 1:
+            trigger.set()  # new events were committed while this run was in progress
+            return 0
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(analyzer_service, "run_once", fake_run_once)
+    until = datetime(2024, 1, 2, tzinfo=timezone.utc)
+
+    # A one-hour interval would block the test if the trigger were ignored.
+    analyzer_service.run_forever(
+        interval_seconds=3600,
+        since=datetime(2024, 1, 1, tzinfo=timezone.utc),
+        until=until,
+        trigger=trigger,
+    )
+
+    assert calls == [datetime(2024, 1, 1, tzinfo=timezone.utc), None]
+    assert not trigger.is_set()
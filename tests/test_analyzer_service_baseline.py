@@ -5,25 +5,15 @@ from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
 import pytest
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import select
 
-from ueba.db.base import Base
-from ueba.db.models import Entity, EntityRiskHistory, NormalizedEvent
+from tests.conftest import bulk_insert, create_entity
+from ueba.db.models import EntityRiskHistory, NormalizedEvent
 from ueba.logging import AlertLogger
 from ueba.services.analyzer.service import AnalyzerService
 
-
-@pytest.fixture()
-def session_factory(tmp_path: Path):
-    db_path = tmp_path / "analyzer_baseline.db"
-    engine = create_engine(f"sqlite:///{db_path}", future=True)
-    Base.metadata.create_all(bind=engine)
-    SessionFactory = sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
-    try:
-        yield SessionFactory
-    finally:
-        Base.metadata.drop_all(bind=engine)
+DAY = timedelta(days=1)
+HOUR = timedelta(hours=1)
 
 
 @pytest.fixture()
@@ -33,50 +23,53 @@ def alert_log_path(tmp_path: Path):
 
 @pytest.fixture()
 def analyzer_service(session_factory, alert_log_path):
-    alert_logger = AlertLogger(alert_log_path)
-    return AnalyzerService(session_factory=session_factory, alert_logger=alert_logger)
-
-
-def _create_entity(session, entity_type: str, value: str) -> Entity:
-    entity = Entity(entity_type=entity_type, entity_value=value)
-    session.add(entity)
-    session.commit()
-    return entity
+    # Buffered like the service default: alerts are written in one append when a run ends.
+    alert_logger = AlertLogger(alert_log_path, flush_bytes=64 * 1024)
+    try:
+        yield AnalyzerService(session_factory=session_factory, alert_logger=alert_logger)
+    finally:
+        alert_logger.close()
 
 
-def _add_event(session, entity_id: int, ts: datetime, event_type: str, severity: int) -> None:
-    session.add(
-        NormalizedEvent(
-            entity_id=entity_id,
-            event_type=event_type,
-            observed_at=ts,
-            normalized_payload={"severity": severity},
-        )
-    )
+# Column values shared by every seeded baseline history row.
+_HISTORY_DEFAULTS = {"reason": '{"generator": "analyzer_service"}', "generator": "analyzer_service"}
 
 
-def _add_history(session, entity_id: int, observed_at: datetime, risk_score: float) -> None:
-    history = EntityRiskHistory(
-        entity_id=entity_id,
-        risk_score=risk_score,
-        observed_at=observed_at,
-        reason='{"generator": "analyzer_service"}',
-    )
-    session.add(history)
+def _latest_reason(session, entity_id: int) -> dict:
+    # Only the reason column is asserted on, so skip hydrating full ORM rows.
+    reason = session.execute(
+        select(EntityRiskHistory.reason)
+        .where(EntityRiskHistory.entity_id == entity_id)
+        .order_by(EntityRiskHistory.observed_at.desc())
+        .limit(1)
+    ).scalar_one()
+    return json.loads(reason)
 
 
 def test_analyzer_service_enriches_results_with_baseline(session_factory, analyzer_service):
     base_time = datetime(2024, 1, 1, 0, 0, 0, tzinfo=timezone.utc)
     
     with session_factory() as session:
-        entity = _create_entity(session, "user", "alice")
+        entity_id = create_entity(session, "user", "alice")
         
         # Create baseline history (30 days)
-        for day in range(30):
-            _add_history(session, entity.id, base_time + timedelta(days=day), 30.0)
-        
+        bulk_insert(
+            session,
+            EntityRiskHistory,
+            [{"observed_at": base_time + day * DAY} for day in range(30)],
+            entity_id=entity_id,
+            risk_score=30.0,
+            **_HISTORY_DEFAULTS,
+        )
         # Add new events for processing
-        _add_event(session, entity.id, base_time + timedelta(days=31, hours=1), "login", 5)
+        bulk_insert(
+            session,
+            NormalizedEvent,
+            [{"observed_at": base_time + timedelta(days=31, hours=1)}],
+            entity_id=entity_id,
+            event_type="login",
+            normalized_payload={"severity": 5},
+        )
         session.commit()
     
     analyzer_service.run_once(
@@ -85,14 +78,8 @@ def test_analyzer_service_enriches_results_with_baseline(session_factory, analyz
     )
     
     with session_factory() as session:
-        history = (
-            session.query(EntityRiskHistory)
-            .filter(EntityRiskHistory.entity_id == entity.id)
-            .order_by(EntityRiskHistory.observed_at.desc())
-            .first()
-        )
+        reason = _latest_reason(session, entity_id)
         
-        reason = json.loads(history.reason)
         assert "baseline" in reason
         assert reason["baseline"]["avg"] is not None
         assert reason["baseline"]["sigma"] is not None
@@ -104,21 +91,27 @@ def test_analyzer_service_logs_anomalies(session_factory, analyzer_service, aler
     base_time = datetime(2024, 1, 1, 0, 0, 0, tzinfo=timezone.utc)
     
     with session_factory() as session:
-        entity = _create_entity(session, "user", "bob")
+        entity_id = create_entity(session, "user", "bob")
         
         # Create stable baseline (avg=20, low sigma)
-        for day in range(30):
-            _add_history(session, entity.id, base_time + timedelta(days=day), 20.0)
-        
+        bulk_insert(
+            session,
+            EntityRiskHistory,
+            [{"observed_at": base_time + day * DAY} for day in range(30)],
+            entity_id=entity_id,
+            risk_score=20.0,
+            **_HISTORY_DEFAULTS,
+        )
         # Add events that will trigger high risk score (anomaly)
-        for i in range(15):
-            _add_event(
-                session,
-                entity.id,
-                base_time + timedelta(days=31, hours=i),
-                "suspicious_activity",
-                severity=9,
-            )
+        event_day = base_time + 31 * DAY
+        bulk_insert(
+            session,
+            NormalizedEvent,
+            [{"observed_at": event_day + i * HOUR} for i in range(15)],
+            entity_id=entity_id,
+            event_type="suspicious_activity",
+            normalized_payload={"severity": 9},
+        )
         session.commit()
     
     analyzer_service.run_once(
@@ -133,7 +126,7 @@ def test_analyzer_service_logs_anomalies(session_factory, analyzer_service, aler
     assert len(lines) >= 1
     
     alert = json.loads(lines[0])
-    assert alert["entity_id"] == entity.id
+    assert alert["entity_id"] == entity_id
     assert alert["risk_score"] > alert["baseline_avg"]
     assert alert["delta"] > 0
     assert "triggered_rules" in alert
@@ -145,15 +138,35 @@ def test_analyzer_service_does_not_log_normal_behavior(
     base_time = datetime(2024, 1, 1, 0, 0, 0, tzinfo=timezone.utc)
     
     with session_factory() as session:
-        entity = _create_entity(session, "user", "charlie")
+        entity_id = create_entity(session, "user", "charlie")
         
         # Create baseline
-        for day in range(30):
-            _add_history(session, entity.id, base_time + timedelta(days=day), 30.0)
-        
+        bulk_insert(
+            session,
+            EntityRiskHistory,
+            [{"observed_at": base_time + day * DAY} for day in range(30)],
+            entity_id=entity_id,
+            risk_score=30.0,
+            **_HISTORY_DEFAULTS,
+        )
         # Add normal events (should not trigger anomaly)
-        _add_event(session, entity.id, base_time + timedelta(days=31, hours=1), "login", 5)
-        _add_event(session, entity.id, base_time + timedelta(days=31, hours=2), "logout", 3)
+        bulk_insert(
+            session,
+            NormalizedEvent,
+            [
+                {
+                    "observed_at": base_time + timedelta(days=31, hours=1),
+                    "event_type": "login",
+                    "normalized_payload": {"severity": 5},
+                },
+                {
+                    "observed_at": base_time + timedelta(days=31, hours=2),
+                    "event_type": "logout",
+                    "normalized_payload": {"severity": 3},
+                },
+            ],
+            entity_id=entity_id,
+        )
         session.commit()
     
     analyzer_service.run_once(
@@ -171,10 +184,17 @@ def test_analyzer_service_handles_no_baseline(session_factory, analyzer_service)
     base_time = datetime(2024, 1, 1, 0, 0, 0, tzinfo=timezone.utc)
     
     with session_factory() as session:
-        entity = _create_entity(session, "user", "dave")
+        entity_id = create_entity(session, "user", "dave")
         
         # No baseline history, just new events
-        _add_event(session, entity.id, base_time + timedelta(hours=1), "login", 5)
+        bulk_insert(
+            session,
+            NormalizedEvent,
+            [{"observed_at": base_time + timedelta(hours=1)}],
+            entity_id=entity_id,
+            event_type="login",
+            normalized_payload={"severity": 5},
+        )
         session.commit()
     
     # Should not crash when no baseline exists
@@ -186,13 +206,8 @@ def test_analyzer_service_handles_no_baseline(session_factory, analyzer_service)
     assert processed == 1
     
     with session_factory() as session:
-        history = (
-            session.query(EntityRiskHistory)
-            .filter(EntityRiskHistory.entity_id == entity.id)
-            .first()
-        )
+        reason = _latest_reason(session, entity_id)
         
-        reason = json.loads(history.reason)
         assert "baseline" in reason
         # When no history, baseline should be 0/0
         assert reason["baseline"]["avg"] == 0.0
@@ -203,17 +218,35 @@ def test_analyzer_service_baseline_per_entity(session_factory, analyzer_service,
     base_time = datetime(2024, 1, 1, 0, 0, 0, tzinfo=timezone.utc)
     
     with session_factory() as session:
-        entity1 = _create_entity(session, "user", "eve")
-        entity2 = _create_entity(session, "user", "frank")
+        entity1_id = create_entity(session, "user", "eve")
+        entity2_id = create_entity(session, "user", "frank")
         
         # Different baselines per entity
-        for day in range(30):
-            _add_history(session, entity1.id, base_time + timedelta(days=day), 20.0)
-            _add_history(session, entity2.id, base_time + timedelta(days=day), 80.0)
-        
+        bulk_insert(
+            session,
+            EntityRiskHistory,
+            [{"observed_at": base_time + day * DAY} for day in range(30)],
+            entity_id=entity1_id,
+            risk_score=20.0,
+            **_HISTORY_DEFAULTS,
+        )
+        bulk_insert(
+            session,
+            EntityRiskHistory,
+            [{"observed_at": base_time + day * DAY} for day in range(30)],
+            entity_id=entity2_id,
+            risk_score=80.0,
+            **_HISTORY_DEFAULTS,
+        )
         # Both get similar events, but different scores relative to baseline
-        _add_event(session, entity1.id, base_time + timedelta(days=31, hours=1), "login", 5)
-        _add_event(session, entity2.id, base_time + timedelta(days=31, hours=1), "login", 5)
+        bulk_insert(
+            session,
+            NormalizedEvent,
+            [{"entity_id": entity1_id}, {"entity_id": entity2_id}],
+            observed_at=base_time + timedelta(days=31, hours=1),
+            event_type="login",
+            normalized_payload={"severity": 5},
+        )
         session.commit()
     
     analyzer_service.run_once(
@@ -222,22 +255,8 @@ def test_analyzer_service_baseline_per_entity(session_factory, analyzer_service,
     )
     
     with session_factory() as session:
-        history1 = (
-            session.query(EntityRiskHistory)
-            .filter(EntityRiskHistory.entity_id == entity1.id)
-            .order_by(EntityRiskHistory.observed_at.desc())
-            .first()
-        )
-        
-        history2 = (
-            session.query(EntityRiskHistory)
-            .filter(EntityRiskHistory.entity_id == entity2.id)
-            .order_by(EntityRiskHistory.observed_at.desc())
-            .first()
-        )
-        
-        reason1 = json.loads(history1.reason)
-        reason2 = json.loads(history2.reason)
+        reason1 = _latest_reason(session, entity1_id)
+        reason2 = _latest_reason(session, entity2_id)
         
         # Each entity should have its own baseline
         assert reason1["baseline"]["avg"] == pytest.approx(20.0)
@@ -248,15 +267,26 @@ def test_analyzer_service_caches_baseline_across_windows(session_factory, analyz
     base_time = datetime(2024, 1, 1, 0, 0, 0, tzinfo=timezone.utc)
     
     with session_factory() as session:
-        entity = _create_entity(session, "user", "grace")
+        entity_id = create_entity(session, "user", "grace")
         
         # Create baseline
-        for day in range(30):
-            _add_history(session, entity.id, base_time + timedelta(days=day), 30.0)
-        
+        bulk_insert(
+            session,
+            EntityRiskHistory,
+            [{"observed_at": base_time + day * DAY} for day in range(30)],
+            entity_id=entity_id,
+            risk_score=30.0,
+            **_HISTORY_DEFAULTS,
+        )
         # Multiple days of new events
-        for day in range(31, 35):
-            _add_event(session, entity.id, base_time + timedelta(days=day, hours=1), "login", 5)
+        bulk_insert(
+            session,
+            NormalizedEvent,
+            [{"observed_at": base_time + day * DAY + HOUR} for day in range(31, 35)],
+            entity_id=entity_id,
+            event_type="login",
+            normalized_payload={"severity": 5},
+        )
         session.commit()
     
     # Process multiple windows in one run
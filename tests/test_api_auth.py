@@ -3,6 +3,8 @@ from __future__ import annotations
 import pytest
 from fastapi.testclient import TestClient
 
+from ueba.api import auth, main
+
 
 def test_health_check_no_auth(client: TestClient):
     """Health check endpoint should not require authentication."""
@@ -71,3 +73,27 @@ def test_settings_with_correct_auth(client: TestClient):
     data = response.json()
     assert "sigma_multiplier" in data
     assert "baseline_window_days" in data
+
+
+def test_credentials_are_cached_after_first_use(client: TestClient, monkeypatch: pytest.MonkeyPatch):
+    """Credentials should be read from the environment once, not on every request."""
+    assert client.get("/api/v1/settings", auth=("testuser", "testpass")).status_code == 200
+
+    monkeypatch.setenv("UEBA_DASH_PASSWORD", "rotated")
+    assert client.get("/api/v1/settings", auth=("testuser", "testpass")).status_code == 200
+
+    auth._load_credentials.cache_clear()
+    assert client.get("/api/v1/settings", auth=("testuser", "testpass")).status_code == 401
+    assert client.get("/api/v1/settings", auth=("testuser", "rotated")).status_code == 200
+    auth._load_credentials.cache_clear()
+
+
+def test_login_stores_hashed_session_token(client: TestClient):
+    """Login tokens should resolve to the user without being stored verbatim."""
+    response = client.post("/login", json={"username": "testuser", "password": "testpass"})
+    assert response.status_code == 200
+    token = response.json()["session_token"]
+
+    assert main._session_tokens.get(main._session_key(token))["username"] == "testuser"
+    assert main._session_tokens.get(main._session_key("not-a-token")) is None
+    assert token not in main._session_tokens
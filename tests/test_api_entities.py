@@ -3,6 +3,10 @@ from __future__ import annotations
 import pytest
 from fastapi.testclient import TestClient
 
+from ueba.api.routers import entities as entities_router
+from ueba.api.routers.entities import _parse_reason_json
+from ueba.db.models import Entity
+
 
 @pytest.fixture
 def auth():
@@ -52,11 +56,30 @@ def test_list_entities_pagination(client: TestClient, sample_entities, auth):
     assert data["page"] == 1
     assert data["page_size"] == 2
 
-    # Second page
+    # Second page (deprecated page= fallback)
     response = client.get("/api/v1/entities?page=2&page_size=2", auth=auth)
     assert response.status_code == 200
     data = response.json()
     assert len(data["items"]) == 1
+    assert data["next_cursor"] is None
+
+
+def test_list_entities_cursor_pagination(client: TestClient, sample_entities, auth):
+    """Should follow next_cursor through the roster without offsets."""
+    response = client.get("/api/v1/entities?page_size=2", auth=auth)
+    assert response.status_code == 200
+    first = response.json()
+    assert len(first["items"]) == 2
+    assert first["next_cursor"] == first["items"][-1]["entity_id"]
+
+    response = client.get(
+        f"/api/v1/entities?after_entity_id={first['next_cursor']}&page_size=2", auth=auth
+    )
+    assert response.status_code == 200
+    second = response.json()
+    assert len(second["items"]) == 1
+    assert second["next_cursor"] is None
+    assert second["items"][0]["entity_id"] > first["next_cursor"]
 
 
 def test_list_entities_with_risk_history(client: TestClient, sample_risk_history, auth):
@@ -147,3 +170,60 @@ def test_entity_history_anomaly_detection(client: TestClient, sample_risk_histor
             assert item["is_anomalous"] is False or item["is_anomalous"] is True
         # For safety, just verify the field exists
         assert "is_anomalous" in item
+
+
+def test_list_entities_combines_latest_risk_and_feedback_per_entity(
+    client: TestClient, sample_risk_history, auth
+):
+    """Roster items should carry each entity's own latest risk and feedback stats."""
+    user_id = sample_risk_history["entity"].id
+    for feedback_type in ("tp", "fp", "fp"):
+        response = client.post(
+            f"/api/v1/entities/{user_id}/feedback",
+            json={"feedback_type": feedback_type},
+            auth=auth,
+        )
+        assert response.status_code == 201
+
+    response = client.get("/api/v1/entities", auth=auth)
+    assert response.status_code == 200
+    items = {item["entity_id"]: item for item in response.json()["items"]}
+
+    user = items[user_id]
+    assert user["latest_risk_score"] == 40.0
+    assert user["last_observed_at"] is not None
+    assert user["tp_count"] == 1
+    assert user["fp_count"] == 2
+    assert user["fp_ratio"] == pytest.approx(2 / 3)
+
+    others = [item for entity_id, item in items.items() if entity_id != user_id]
+    assert others
+    for item in others:
+        assert item["latest_risk_score"] is None
+        assert item["last_observed_at"] is None
+        assert item["tp_count"] == 0
+        assert item["fp_count"] == 0
+
+
+def test_parse_reason_json_handles_bytes_and_malformed_payloads():
+    """Reason parsing should accept str or bytes and fall back to an empty dict."""
+    assert _parse_reason_json('{"baseline": {"avg": 1.5}}') == {"baseline": {"avg": 1.5}}
+    assert _parse_reason_json(b'{"rules": {"triggered": ["r1"]}}') == {"rules": {"triggered": ["r1"]}}
+    assert _parse_reason_json("not json") == {}
+    assert _parse_reason_json(None) == {}
+
+
+def test_list_entities_total_count_is_cached(client: TestClient, session, sample_entities, auth):
+    """total_count should be reused within the cache window, items should not."""
+    first = client.get("/api/v1/entities", auth=auth).json()
+    assert first["total_count"] == 3
+
+    session.add(Entity(entity_type="host", entity_value="host-99"))
+    session.commit()
+
+    second = client.get("/api/v1/entities", auth=auth).json()
+    assert second["total_count"] == 3
+    assert len(second["items"]) == 4
+
+    entities_router._entity_count_cache.clear()
+    assert client.get("/api/v1/entities", auth=auth).json()["total_count"] == 4
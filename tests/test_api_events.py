@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from datetime import datetime, timezone
+
 import pytest
 from fastapi.testclient import TestClient
 
@@ -93,3 +95,13 @@ def test_entity_events_event_types_varied(client: TestClient, sample_events, aut
     event_types = {item["event_type"] for item in data["items"]}
     assert "suspicious_login" in event_types
     assert "file_access" in event_types
+
+
+def test_get_events_soft_deleted_entity(client: TestClient, session, sample_entities, auth):
+    """Soft-deleted entities should be treated as missing."""
+    entity = sample_entities["user1"]
+    entity.deleted_at = datetime.now(timezone.utc)
+    session.commit()
+
+    response = client.get(f"/api/v1/entities/{entity.id}/events", auth=auth)
+    assert response.status_code == 404
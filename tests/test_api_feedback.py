@@ -1,8 +1,13 @@
 from __future__ import annotations
 
+from datetime import datetime, timedelta, timezone
+
 import pytest
 from fastapi.testclient import TestClient
 
+from tests.conftest import bulk_insert
+from ueba.db.models import TPFPFeedback
+
 
 @pytest.fixture
 def auth():
@@ -10,6 +15,19 @@ def auth():
     return ("testuser", "testpass")
 
 
+def _feedback_rows(feedback_types) -> list:
+    """Feedback rows one minute apart, in the order "testuser" would have submitted them."""
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "feedback_type": feedback_type,
+            "notes": f"Feedback {index}",
+            "submitted_at": start + timedelta(minutes=index),
+        }
+        for index, feedback_type in enumerate(feedback_types)
+    ]
+
+
 def test_get_feedback_empty(client: TestClient, sample_entities, auth):
     """Should return empty feedback list for entity without feedback."""
     entity_id = sample_entities["user1"].id
@@ -142,24 +160,17 @@ def test_post_feedback_entity_not_found(client: TestClient, auth):
     assert "Entity not found" in data["detail"]
 
 
-def test_feedback_stats_calculation(client: TestClient, sample_entities, auth):
+def test_feedback_stats_calculation(client: TestClient, session, sample_entities, auth):
     """Should correctly calculate TP/FP stats."""
     entity_id = sample_entities["user1"].id
-
-    # Submit 3 TP and 2 FP
-    for i in range(3):
-        client.post(
-            f"/api/v1/entities/{entity_id}/feedback",
-            json={"feedback_type": "tp"},
-            auth=auth,
-        )
-
-    for i in range(2):
-        client.post(
-            f"/api/v1/entities/{entity_id}/feedback",
-            json={"feedback_type": "fp"},
-            auth=auth,
-        )
+    bulk_insert(
+        session,
+        TPFPFeedback,
+        _feedback_rows(["tp"] * 3 + ["fp"] * 2),
+        entity_id=entity_id,
+        submitted_by="testuser",
+    )
+    session.commit()
 
     response = client.get(f"/api/v1/entities/{entity_id}/feedback", auth=auth)
     assert response.status_code == 200
@@ -169,17 +180,17 @@ def test_feedback_stats_calculation(client: TestClient, sample_entities, auth):
     assert abs(data["stats"]["fp_ratio"] - 0.4) < 0.001
 
 
-def test_feedback_history_order(client: TestClient, sample_entities, auth):
+def test_feedback_history_order(client: TestClient, session, sample_entities, auth):
     """Should return feedback in reverse chronological order."""
     entity_id = sample_entities["user1"].id
-
-    # Submit multiple feedback items
-    for i in range(3):
-        client.post(
-            f"/api/v1/entities/{entity_id}/feedback",
-            json={"feedback_type": "tp", "notes": f"Feedback {i}"},
-            auth=auth,
-        )
+    bulk_insert(
+        session,
+        TPFPFeedback,
+        _feedback_rows(["tp"] * 3),
+        entity_id=entity_id,
+        submitted_by="testuser",
+    )
+    session.commit()
 
     response = client.get(f"/api/v1/entities/{entity_id}/feedback", auth=auth)
     assert response.status_code == 200
@@ -189,19 +200,20 @@ def test_feedback_history_order(client: TestClient, sample_entities, auth):
     # Verify reverse chronological order
     timestamps = [item["submitted_at"] for item in data["items"]]
     assert timestamps == sorted(timestamps, reverse=True)
+    assert [item["notes"] for item in data["items"]] == ["Feedback 2", "Feedback 1", "Feedback 0"]
 
 
-def test_feedback_limit_parameter(client: TestClient, sample_entities, auth):
+def test_feedback_limit_parameter(client: TestClient, session, sample_entities, auth):
     """Should respect limit parameter in GET feedback."""
     entity_id = sample_entities["user1"].id
-
-    # Submit 10 feedback items
-    for i in range(10):
-        client.post(
-            f"/api/v1/entities/{entity_id}/feedback",
-            json={"feedback_type": "tp"},
-            auth=auth,
-        )
+    bulk_insert(
+        session,
+        TPFPFeedback,
+        _feedback_rows(["tp"] * 10),
+        entity_id=entity_id,
+        submitted_by="testuser",
+    )
+    session.commit()
 
     # Test default limit (100, so should return all 10)
     response = client.get(f"/api/v1/entities/{entity_id}/feedback", auth=auth)
@@ -212,6 +224,26 @@ def test_feedback_limit_parameter(client: TestClient, sample_entities, auth):
     assert len(response.json()["items"]) == 5
 
 
+def test_feedback_stats_ignore_limit(client: TestClient, session, sample_entities, auth):
+    """Stats should count every submission, not just the returned page."""
+    entity_id = sample_entities["user1"].id
+    bulk_insert(
+        session,
+        TPFPFeedback,
+        _feedback_rows(["tp", "tp", "fp", "tp", "fp", "fp"]),
+        entity_id=entity_id,
+        submitted_by="testuser",
+    )
+    session.commit()
+
+    response = client.get(f"/api/v1/entities/{entity_id}/feedback?limit=2", auth=auth)
+    data = response.json()
+    assert len(data["items"]) == 2
+    assert data["stats"]["tp_count"] == 3
+    assert data["stats"]["fp_count"] == 3
+    assert data["stats"]["fp_ratio"] == 0.5
+
+
 def test_feedback_auth_required(client: TestClient, sample_entities):
     """Should require authentication to access feedback endpoints."""
     entity_id = sample_entities["user1"].id
@@ -237,21 +269,17 @@ def test_feedback_auth_invalid_credentials(client: TestClient, sample_entities):
     assert response.status_code == 401
 
 
-def test_list_entities_includes_feedback_stats(client: TestClient, sample_entities, auth):
+def test_list_entities_includes_feedback_stats(client: TestClient, session, sample_entities, auth):
     """Should include TP/FP stats in entities list."""
     entity_id = sample_entities["user1"].id
-
-    # Submit some feedback
-    client.post(
-        f"/api/v1/entities/{entity_id}/feedback",
-        json={"feedback_type": "tp"},
-        auth=auth,
-    )
-    client.post(
-        f"/api/v1/entities/{entity_id}/feedback",
-        json={"feedback_type": "fp"},
-        auth=auth,
+    bulk_insert(
+        session,
+        TPFPFeedback,
+        _feedback_rows(["tp", "fp"]),
+        entity_id=entity_id,
+        submitted_by="testuser",
     )
+    session.commit()
 
     response = client.get("/api/v1/entities", auth=auth)
     assert response.status_code == 200
@@ -1,10 +1,13 @@
 from __future__ import annotations
 
-from datetime import datetime
+from datetime import datetime, timezone
 
 import pytest
 from fastapi.testclient import TestClient
 
+from ueba.api.routers import health
+from ueba.db.models import EntityRiskHistory
+
 
 def test_health_check(client: TestClient):
     """Health check should work without auth."""
@@ -78,3 +81,42 @@ def test_settings_with_risk_history(client: TestClient, sample_risk_history, aut
     # Should have a last_analyzer_run_at timestamp
     assert data["last_analyzer_run_at"] is not None
     datetime.fromisoformat(data["last_analyzer_run_at"])
+
+
+def test_settings_ignores_history_from_other_generators(client: TestClient, session, sample_entities, auth):
+    """Only analyzer-generated history should count as an analyzer run."""
+    session.add(
+        EntityRiskHistory(
+            entity_id=sample_entities["user1"].id,
+            risk_score=10.0,
+            observed_at=datetime(2024, 1, 1, tzinfo=timezone.utc),
+            reason='{"generator": "manual_import"}',
+            generator="manual_import",
+        )
+    )
+    session.commit()
+
+    response = client.get("/api/v1/settings", auth=auth)
+    assert response.status_code == 200
+    assert response.json()["last_analyzer_run_at"] is None
+
+
+def test_settings_response_is_cached(client: TestClient, session, sample_entities, auth):
+    """Settings should be served from cache until the TTL window passes."""
+    first = client.get("/api/v1/settings", auth=auth).json()
+    assert first["last_analyzer_run_at"] is None
+
+    session.add(
+        EntityRiskHistory(
+            entity_id=sample_entities["user1"].id,
+            risk_score=10.0,
+            observed_at=datetime(2024, 1, 1, tzinfo=timezone.utc),
+            generator="analyzer_service",
+        )
+    )
+    session.commit()
+
+    assert client.get("/api/v1/settings", auth=auth).json() == first
+
+    health._settings_cache.clear()
+    assert client.get("/api/v1/settings", auth=auth).json()["last_analyzer_run_at"] is not None
@@ -2,29 +2,14 @@ from __future__ import annotations
 
 import os
 from datetime import datetime, timedelta, timezone
-from pathlib import Path
 
 import pytest
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 
-from ueba.db.base import Base
+from tests.conftest import bulk_insert
 from ueba.db.models import Entity, EntityRiskHistory
 from ueba.services.analyzer.baseline import BaselineCalculator, BaselineStats
 
 
-@pytest.fixture
-def session_factory(tmp_path: Path):
-    db_path = tmp_path / "test_baseline.db"
-    engine = create_engine(f"sqlite:///{db_path}", future=True)
-    Base.metadata.create_all(bind=engine)
-    SessionFactory = sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
-    try:
-        yield SessionFactory
-    finally:
-        Base.metadata.drop_all(bind=engine)
-
-
 @pytest.fixture
 def sample_entity(session_factory):
     with session_factory() as session:
@@ -34,14 +19,7 @@ def sample_entity(session_factory):
         return entity.id
 
 
-def _add_history(session, entity_id: int, observed_at: datetime, risk_score: float):
-    history = EntityRiskHistory(
-        entity_id=entity_id,
-        risk_score=risk_score,
-        observed_at=observed_at,
-        reason='{"generator": "test"}',
-    )
-    session.add(history)
+_REASON = '{"generator": "test"}'
 
 
 def test_baseline_calculator_returns_zero_when_no_history(session_factory, sample_entity):
@@ -57,13 +35,16 @@ def test_baseline_calculator_computes_avg_and_sigma(session_factory, sample_enti
     base_time = datetime(2024, 1, 15, 0, 0, 0, tzinfo=timezone.utc)
     
     with session_factory() as session:
-        for day in range(10):
-            _add_history(
-                session,
-                sample_entity,
-                base_time + timedelta(days=day),
-                risk_score=20.0 + day * 5,
-            )
+        bulk_insert(
+            session,
+            EntityRiskHistory,
+            [
+                {"observed_at": base_time + timedelta(days=day), "risk_score": 20.0 + day * 5}
+                for day in range(10)
+            ],
+            entity_id=sample_entity,
+            reason=_REASON,
+        )
         session.commit()
         
         calc = BaselineCalculator(session, window_days=30)
@@ -80,19 +61,23 @@ def test_baseline_calculator_respects_window_days(session_factory, sample_entity
     
     with session_factory() as session:
         # Add 40 days of history
-        for day in range(40):
-            _add_history(
-                session,
-                sample_entity,
-                base_time + timedelta(days=day),
-                risk_score=30.0,
-            )
+        bulk_insert(
+            session,
+            EntityRiskHistory,
+            [
+                {"observed_at": base_time + timedelta(days=day), "risk_score": 30.0}
+                for day in range(40)
+            ],
+            entity_id=sample_entity,
+            reason=_REASON,
+        )
         # Add one outlier 35 days ago
-        _add_history(
+        bulk_insert(
             session,
-            sample_entity,
-            base_time + timedelta(days=5),
-            risk_score=100.0,
+            EntityRiskHistory,
+            [{"observed_at": base_time + timedelta(days=5), "risk_score": 100.0}],
+            entity_id=sample_entity,
+            reason=_REASON,
         )
         session.commit()
         
@@ -109,13 +94,16 @@ def test_baseline_calculator_caches_results(session_factory, sample_entity):
     base_time = datetime(2024, 1, 15, 0, 0, 0, tzinfo=timezone.utc)
     
     with session_factory() as session:
-        for day in range(5):
-            _add_history(
-                session,
-                sample_entity,
-                base_time + timedelta(days=day),
-                risk_score=20.0,
-            )
+        bulk_insert(
+            session,
+            EntityRiskHistory,
+            [
+                {"observed_at": base_time + timedelta(days=day), "risk_score": 20.0}
+                for day in range(5)
+            ],
+            entity_id=sample_entity,
+            reason=_REASON,
+        )
         session.commit()
         
         calc = BaselineCalculator(session)
@@ -128,21 +116,24 @@ def test_baseline_calculator_caches_results(session_factory, sample_entity):
         baseline2 = calc.get_baseline(sample_entity, until)
         
         assert baseline1 is baseline2
-        assert sample_entity in calc.cache
+        assert (sample_entity, until) in calc.cache
 
 
 def test_is_anomalous_detects_outliers(session_factory, sample_entity):
     base_time = datetime(2024, 1, 1, 0, 0, 0, tzinfo=timezone.utc)
     
     with session_factory() as session:
-        # Create baseline: avg=30, sigma=5
-        for day in range(10):
-            _add_history(
-                session,
-                sample_entity,
-                base_time + timedelta(days=day),
-                risk_score=25.0 + (day % 3) * 5,  # varies between 25, 30, 35
-            )
+        # Create baseline: avg=30, sigma=5; scores vary between 25, 30, 35
+        bulk_insert(
+            session,
+            EntityRiskHistory,
+            [
+                {"observed_at": base_time + timedelta(days=day), "risk_score": 25.0 + (day % 3) * 5}
+                for day in range(10)
+            ],
+            entity_id=sample_entity,
+            reason=_REASON,
+        )
         session.commit()
         
         calc = BaselineCalculator(session, sigma_multiplier=2.0)
@@ -162,13 +153,16 @@ def test_is_anomalous_returns_delta(session_factory, sample_entity):
     base_time = datetime(2024, 1, 1, 0, 0, 0, tzinfo=timezone.utc)
     
     with session_factory() as session:
-        for day in range(5):
-            _add_history(
-                session,
-                sample_entity,
-                base_time + timedelta(days=day),
-                risk_score=50.0,
-            )
+        bulk_insert(
+            session,
+            EntityRiskHistory,
+            [
+                {"observed_at": base_time + timedelta(days=day), "risk_score": 50.0}
+                for day in range(5)
+            ],
+            entity_id=sample_entity,
+            reason=_REASON,
+        )
         session.commit()
         
         calc = BaselineCalculator(session)
@@ -191,9 +185,14 @@ def test_baseline_calculator_handles_multiple_entities(session_factory):
         session.commit()
         
         # Different baselines for different entities
-        for day in range(5):
-            _add_history(session, entity1.id, base_time + timedelta(days=day), 20.0)
-            _add_history(session, entity2.id, base_time + timedelta(days=day), 80.0)
+        days = [base_time + timedelta(days=day) for day in range(5)]
+        bulk_insert(
+            session,
+            EntityRiskHistory,
+            [{"entity_id": entity1.id, "observed_at": day, "risk_score": 20.0} for day in days]
+            + [{"entity_id": entity2.id, "observed_at": day, "risk_score": 80.0} for day in days],
+            reason=_REASON,
+        )
         session.commit()
         
         calc = BaselineCalculator(session)
@@ -213,8 +212,16 @@ def test_baseline_calculator_respects_env_vars(session_factory, sample_entity, m
     monkeypatch.setenv("UEBA_SIGMA_MULTIPLIER", "2.5")
     
     with session_factory() as session:
-        for day in range(10):
-            _add_history(session, sample_entity, base_time + timedelta(days=day), 30.0)
+        bulk_insert(
+            session,
+            EntityRiskHistory,
+            [
+                {"observed_at": base_time + timedelta(days=day), "risk_score": 30.0}
+                for day in range(10)
+            ],
+            entity_id=sample_entity,
+            reason=_REASON,
+        )
         session.commit()
         
         # Calculator should read from env
@@ -228,15 +235,23 @@ def test_baseline_calculator_filters_deleted_history(session_factory, sample_ent
     
     with session_factory() as session:
         # Add normal history
-        for day in range(5):
-            _add_history(session, sample_entity, base_time + timedelta(days=day), 30.0)
+        bulk_insert(
+            session,
+            EntityRiskHistory,
+            [
+                {"observed_at": base_time + timedelta(days=day), "risk_score": 30.0}
+                for day in range(5)
+            ],
+            entity_id=sample_entity,
+            reason=_REASON,
+        )
         
         # Add deleted history with high score
         deleted_history = EntityRiskHistory(
             entity_id=sample_entity,
             risk_score=100.0,
             observed_at=base_time + timedelta(days=3),
-            reason='{"generator": "test"}',
+            reason=_REASON,
             deleted_at=base_time + timedelta(days=10),
         )
         session.add(deleted_history)
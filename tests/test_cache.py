@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import pytest
+
+from ueba.utils import TTLCache
+
+
+class FakeTimer:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_ttl_cache_expires_entries():
+    timer = FakeTimer()
+    cache: TTLCache[str, int] = TTLCache(maxsize=10, ttl=5, timer=timer)
+    cache["a"] = 1
+
+    timer.now = 4.9
+    assert cache.get("a") == 1
+
+    timer.now = 5.0
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache: TTLCache[str, int] = TTLCache(maxsize=2, ttl=60)
+    cache["a"] = 1
+    cache["b"] = 2
+    assert cache.get("a") == 1  # "b" is now the oldest entry
+
+    cache["c"] = 3
+
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_ttl_cache_rejects_non_positive_maxsize():
+    with pytest.raises(ValueError):
+        TTLCache(maxsize=0, ttl=1)
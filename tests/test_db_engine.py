@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy import text
+from sqlalchemy.pool import StaticPool
+
+from ueba.db.base import _create_engine, get_engine, get_session_factory, session_scope
+from ueba.utils import json_codec
+
+
+def test_sqlite_file_engine_keeps_default_journal(tmp_path, monkeypatch):
+    monkeypatch.delenv("UEBA_SQLITE_WAL", raising=False)
+    engine = _create_engine(f"sqlite:///{tmp_path / 'ueba.db'}")
+    with engine.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "delete"
+    engine.dispose()
+
+
+def test_sqlite_file_engine_uses_wal_when_enabled(tmp_path, monkeypatch):
+    monkeypatch.setenv("UEBA_SQLITE_WAL", "1")
+    engine = _create_engine(f"sqlite:///{tmp_path / 'ueba.db'}")
+    with engine.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        # NORMAL == 1
+        assert connection.execute(text("PRAGMA synchronous")).scalar() == 1
+    engine.dispose()
+
+
+def test_insert_page_size_comes_from_environment(monkeypatch):
+    monkeypatch.setenv("UEBA_DB_INSERT_PAGE_SIZE", "250")
+    engine = _create_engine("sqlite:///:memory:")
+    assert engine.dialect.insertmanyvalues_page_size == 250
+    engine.dispose()
+
+
+def test_sqlite_memory_engine_shares_one_connection():
+    engine = _create_engine("sqlite:///:memory:")
+    assert isinstance(engine.pool, StaticPool)
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE t (x INTEGER)"))
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT COUNT(*) FROM t")).scalar() == 0
+    engine.dispose()
+
+
+def test_engine_round_trips_json_columns(tmp_path):
+    engine = _create_engine(f"sqlite:///{tmp_path / 'ueba.db'}")
+    payload = {"data": {"severity": 7}, "tags": ["a", "b"]}
+    table = sa.table("t", sa.column("doc", sa.JSON))
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE t (doc JSON)"))
+        connection.execute(sa.insert(table).values(doc=payload))
+        raw = connection.execute(text("SELECT doc FROM t")).scalar()
+        loaded = connection.execute(sa.select(table.c.doc)).scalar()
+    if json_codec.HAS_ORJSON:
+        assert raw == '{"data":{"severity":7},"tags":["a","b"]}'
+    else:
+        assert raw == '{"data": {"severity": 7}, "tags": ["a", "b"]}'
+    assert loaded == payload
+    engine.dispose()
+
+
+def test_session_scope_commits_and_rolls_back(tmp_path):
+    url = f"sqlite:///{tmp_path / 'ueba.db'}"
+    with session_scope(url) as session:
+        session.execute(text("CREATE TABLE t (x INTEGER)"))
+        session.execute(text("INSERT INTO t VALUES (1)"))
+
+    with pytest.raises(RuntimeError):
+        with session_scope(url) as session:
+            session.execute(text("INSERT INTO t VALUES (2)"))
+            raise RuntimeError("boom")
+
+    with session_scope(url) as session:
+        assert session.execute(text("SELECT x FROM t")).scalars().all() == [1]
+    get_engine(url).dispose()
+
+
+def test_session_factory_hands_out_independent_sessions(tmp_path):
+    factory = get_session_factory(f"sqlite:///{tmp_path / 'ueba.db'}")
+    first, second = factory(), factory()
+    assert first is not second
+    first.close()
+    second.close()
@@ -1,29 +1,56 @@
 from __future__ import annotations
 
+import shutil
+import threading
+import time
 from pathlib import Path
 from typing import Dict
 
 import pytest
-from sqlalchemy import create_engine, select
+from sqlalchemy import create_engine, event, select
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 
 from ueba.config import mapping_loader
-from ueba.db.base import Base
+from ueba.db.base import Base, get_engine, get_session_factory
 from ueba.db.models import Entity, NormalizedEvent, RawAlert
+from ueba.services.mapper import inputs, mapper_service
+from ueba.services.mapper.inputs import MessageQueueStubSource
 from ueba.services.mapper.mapper import AlertMapper
-from ueba.services.mapper.persistence import PersistenceManager
+from ueba.services.mapper.persistence import EntityPayload, PersistenceManager, RawAlertBatcher
 
 
-@pytest.fixture()
-def session_factory(tmp_path: Path):
-    db_path = tmp_path / "ueba_test.db"
-    engine = create_engine(f"sqlite:///{db_path}", future=True)
+@pytest.fixture(scope="session")
+def template_db(tmp_path_factory) -> Path:
+    """An empty database with the schema built once; tests start from a copy of it."""
+    path = tmp_path_factory.mktemp("template") / "ueba_template.db"
+    engine = create_engine(f"sqlite:///{path}", future=True)
     Base.metadata.create_all(bind=engine)
+    engine.dispose()
+    return path
+
+
+def _database_from_template(template_db: Path, path: Path) -> str:
+    shutil.copyfile(template_db, path)
+    return f"sqlite:///{path}"
+
+
+@pytest.fixture()
+def session_factory(tmp_path: Path, template_db: Path):
+    database_url = _database_from_template(template_db, tmp_path / "ueba_test.db")
+    # One shared connection for every session in the test instead of a new one per session.
+    engine = create_engine(
+        database_url,
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+        future=True,
+    )
     SessionFactory = sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
     try:
         yield SessionFactory
     finally:
-        Base.metadata.drop_all(bind=engine)
+        # tmp_path removes the database file; no need to drop every table first.
+        engine.dispose()
 
 
 @pytest.fixture()
@@ -125,3 +152,227 @@ def test_entity_upsert_updates_attributes(session_factory, resolver):
 
         entity = session.execute(select(Entity)).scalar_one()
         assert entity.attributes["agent_name"] == "host-updated"
+
+
+def test_batcher_writes_batch_and_skips_duplicates(session_factory, resolver):
+    mapper = AlertMapper(resolver)
+
+    with session_factory() as session:
+        persistence = PersistenceManager(session)
+        mapper.map_and_persist(sample_alert(id="stored"), persistence)
+        session.commit()
+
+        batcher = RawAlertBatcher(persistence)
+        for alert_id in ["stored", "new-1", "new-2", "new-1"]:
+            mapped = mapper.map_alert(sample_alert(id=alert_id))
+            mapped.raw_alert_payload.entity_id = session.execute(select(Entity.id)).scalar_one()
+            mapped.normalized_event_payload.entity_id = mapped.raw_alert_payload.entity_id
+            batcher.add(mapped.raw_alert_payload, mapped.normalized_event_payload)
+
+        assert batcher.flush() == (2, 2)
+        assert len(batcher) == 0
+        session.commit()
+
+        raw_alerts = session.execute(select(RawAlert)).scalars().all()
+        assert len(raw_alerts) == 3
+
+        events = session.execute(select(NormalizedEvent)).scalars().all()
+        assert len(events) == 3
+        raw_ids = {raw_alert.id for raw_alert in raw_alerts}
+        assert {event.raw_alert_id for event in events} == raw_ids
+        entity = session.execute(select(Entity)).scalar_one()
+        assert all(event.entity_id == entity.id for event in events)
+
+
+def test_batcher_issues_one_insert_per_table(session_factory, resolver):
+    mapper = AlertMapper(resolver)
+
+    with session_factory() as session:
+        persistence = PersistenceManager(session)
+        entity = persistence.upsert_entity(
+            EntityPayload(entity_type="host", entity_value="web-1", display_name=None, attributes={})
+        )
+        batcher = RawAlertBatcher(persistence)
+        for index in range(25):
+            mapped = mapper.map_alert(sample_alert(id=f"alert-{index}"))
+            mapped.raw_alert_payload.entity_id = entity.id
+            mapped.normalized_event_payload.entity_id = entity.id
+            batcher.add(mapped.raw_alert_payload, mapped.normalized_event_payload)
+
+        inserts = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith("INSERT"):
+                inserts.append(statement)
+
+        engine = session.get_bind()
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            assert batcher.flush(check_existing=False) == (25, 0)
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+
+    assert len(inserts) == 2
+    assert "raw_alerts" in inserts[0] and "normalized_events" in inserts[1]
+
+
+def test_run_mapper_service_persists_in_batches(tmp_path: Path, template_db, resolver, monkeypatch):
+    database_url = _database_from_template(template_db, tmp_path / "mapper.db")
+    monkeypatch.setattr(mapper_service, "load_mappings", lambda paths: resolver)
+
+    alerts = [sample_alert(id=f"alert-{i}") for i in range(5)] + [sample_alert(id="alert-0")]
+    mapper_service.run_mapper_service(
+        MessageQueueStubSource(alerts), database_url=database_url, batch_size=2
+    )
+
+    # A replay of already-stored alerts is skipped before mapping.
+    mapper_service.run_mapper_service(
+        MessageQueueStubSource(alerts), database_url=database_url, batch_size=2
+    )
+
+    with get_session_factory(database_url)() as session:
+        assert len(session.execute(select(RawAlert)).scalars().all()) == 5
+        events = session.execute(select(NormalizedEvent)).scalars().all()
+        assert len(events) == 5
+        entity_id = session.execute(select(Entity.id)).scalar_one()
+        assert all(event.entity_id == entity_id for event in events)
+    get_engine(database_url).dispose()
+
+
+def test_existing_dedupe_hashes_returns_stored_ids(session_factory, resolver):
+    mapper = AlertMapper(resolver)
+
+    with session_factory() as session:
+        persistence = PersistenceManager(session)
+        result = mapper.map_and_persist(sample_alert(), persistence)
+        stored_hash = session.execute(select(RawAlert.dedupe_hash)).scalar_one()
+
+        assert persistence.existing_dedupe_hashes([stored_hash, "missing", stored_hash]) == {
+            stored_hash: result["raw_alert_id"]
+        }
+        assert persistence.existing_dedupe_hashes([]) == {}
+
+
+def test_upsert_entities_merges_and_inserts_in_one_batch(session_factory):
+    with session_factory() as session:
+        persistence = PersistenceManager(session)
+        persistence.upsert_entity(
+            EntityPayload(
+                entity_type="host",
+                entity_value="001",
+                display_name="host-1",
+                attributes={"agent_name": "host-1", "os": "linux"},
+            )
+        )
+        session.commit()
+
+        entity_ids = persistence.upsert_entities(
+            [
+                EntityPayload("host", "001", None, {"agent_name": "host-renamed"}),
+                EntityPayload("host", "002", "host-2", {"agent_name": "host-2"}),
+                EntityPayload("host", "002", None, {"ip": "10.0.0.2"}),
+            ]
+        )
+        session.commit()
+
+        entities = {
+            entity.entity_value: entity
+            for entity in session.execute(select(Entity)).scalars().all()
+        }
+        assert entity_ids == {
+            ("host", "001"): entities["001"].id,
+            ("host", "002"): entities["002"].id,
+        }
+        session.refresh(entities["001"])
+        assert entities["001"].display_name == "host-1"
+        assert entities["001"].attributes == {"agent_name": "host-renamed", "os": "linux"}
+        assert entities["002"].display_name == "host-2"
+        assert entities["002"].attributes == {"agent_name": "host-2", "ip": "10.0.0.2"}
+        assert persistence.upsert_entities([]) == {}
+
+
+def test_file_tail_source_parses_chunked_lines(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(inputs, "READ_CHUNK_SIZE", 7)
+    path = tmp_path / "alerts.json"
+    path.write_bytes(b'{"id": "a"}\n\nnot json\n{"id": "b", "text": "caf\xc3\xa9"}\n{"id": "c"}')
+
+    alerts = list(inputs.FileTailSource(path))
+
+    assert alerts == [{"id": "a"}, {"id": "b", "text": "café"}, {"id": "c"}]
+
+
+def test_run_mapper_service_writes_partial_batch_after_flush_interval(
+    tmp_path: Path, template_db, resolver, monkeypatch
+):
+    database_url = _database_from_template(template_db, tmp_path / "mapper.db")
+    monkeypatch.setattr(mapper_service, "load_mappings", lambda paths: resolver)
+    factory = get_session_factory(database_url)
+    written = threading.Event()
+
+    def slow_source():
+        yield sample_alert(id="first")
+        # Hold the input open until the lone alert shows up in the database.
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            with factory() as session:
+                if session.execute(select(RawAlert.id)).first() is not None:
+                    written.set()
+                    break
+            time.sleep(0.02)
+
+    mapper_service.run_mapper_service(
+        slow_source(), database_url=database_url, batch_size=100, flush_interval=0.05
+    )
+
+    assert written.is_set()
+    get_engine(database_url).dispose()
+
+
+def test_run_mapper_service_reraises_input_errors_after_writing_read_alerts(
+    tmp_path: Path, template_db, resolver, monkeypatch
+):
+    database_url = _database_from_template(template_db, tmp_path / "mapper.db")
+    monkeypatch.setattr(mapper_service, "load_mappings", lambda paths: resolver)
+
+    def broken_source():
+        yield sample_alert(id="before-failure")
+        raise OSError("input went away")
+
+    with pytest.raises(OSError, match="input went away"):
+        mapper_service.run_mapper_service(broken_source(), database_url=database_url)
+
+    with get_session_factory(database_url)() as session:
+        assert session.execute(select(RawAlert.id)).scalar_one() is not None
+    get_engine(database_url).dispose()
+
+
+def test_next_batch_target_grows_with_backlog_and_shrinks_when_idle():
+    assert mapper_service._next_batch_target(10, True, 10, 100) == 20
+    assert mapper_service._next_batch_target(80, True, 10, 100) == 100
+    assert mapper_service._next_batch_target(40, False, 10, 100) == 20
+    assert mapper_service._next_batch_target(15, False, 10, 100) == 10
+
+
+def test_file_tail_source_follows_appended_lines(tmp_path: Path):
+    path = tmp_path / "alerts.json"
+    path.write_bytes(b'{"id": "a"}\n')
+
+    def append_later():
+        time.sleep(0.05)
+        with path.open("ab") as f:
+            f.write(b'{"id": "b"}\n')
+
+    writer = threading.Thread(target=append_later)
+    writer.start()
+    source = iter(inputs.FileTailSource(path, follow=True, poll_interval=0.01))
+    try:
+        assert [next(source), next(source)] == [{"id": "a"}, {"id": "b"}]
+    finally:
+        source.close()
+        writer.join()
+
+
+def test_message_queue_stub_source_keeps_order_and_skips_bad_entries():
+    messages = ['{"id": "a"}', {"id": "b"}, "not json", 42, b'{"id": "c"}']
+
+    assert list(MessageQueueStubSource(messages)) == [{"id": "a"}, {"id": "b"}, {"id": "c"}]
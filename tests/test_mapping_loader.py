@@ -198,3 +198,35 @@ def test_selector_fallback_order(tmp_path: Path) -> None:
 
     default_result = resolver.lookup(groups=["other"])  # no selectors hit
     assert default_result.entity_type == "default"
+
+
+def test_lookup_caches_resolution_and_returns_copies(tmp_path: Path) -> None:
+    mapping_file = _write_yaml(
+        tmp_path,
+        "cached.yml",
+        """
+        priority: global
+        defaults:
+          entity_id: base
+          entity_type: default
+          severity: low
+          timestamp: base.ts
+        selectors:
+          - name: rule-specific
+            match:
+              rule_id: "3001"
+            fields:
+              entity_type: rule
+        """,
+    )
+
+    resolver = mapping_loader.load([mapping_file])
+
+    first = resolver.lookup(rule_id="3001", custom={"a": "1", "b": "2"})
+    first.entity_type = "mutated"
+    first.enrichment["extra"] = "x"
+
+    second = resolver.lookup(rule_id=3001, custom={"b": "2", "a": "1"})
+    assert second.entity_type == "rule"
+    assert second.enrichment == {}
+    assert resolver._resolve_cached.cache_info().hits == 1